@@ -0,0 +1,283 @@
+"""
+Headless benchmarks for the dashboard's stages on the synthetic databases.
+
+Every stage is one of the functions the dashboard calls (load, bitmap cascade, the
+12-filter apply, ID parsing, paging, SQL pushdown, the styled st.dataframe payload,
+the exports), timed `--repeat` times. Each dataset size runs in its own subprocess,
+so caches start cold and the peak RSS reported is that size's own.
+
+Results are appended to benchmark_results.jsonl (one line per run, with the git
+commit and library versions), so runs can be compared over time.
+
+    python synthetic_db.py --rows 10k 100k 1M          # datasets first
+    python benchmark.py                                # every synthetic/latency_results_*.db
+    python benchmark.py --sizes 10k 100k --repeat 9 --label "bitmap index"
+    python benchmark.py --apptest                      # also full AppTest reruns
+    python benchmark.py --compare                      # last two stored runs
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from latency_perf import peak_rss_bytes
+from synthetic_db import OUT_DIR, SIZES, output_path, parse_size
+
+RESULTS_PATH = os.path.join(os.path.dirname(__file__), 'benchmark_results.jsonl')
+DASHBOARD_PATH = os.path.join(os.path.dirname(__file__), 'latency_dashboard.py')
+
+DEFAULT_REPEAT = 5
+PAGE_SIZE = 100
+# xlsx export is capped so the large sizes finish; the cap is stored with the results
+EXPORT_ROWS = 50_000
+
+ID_INPUT = ", ".join([f"{i * 1000}-{i * 1000 + 499}" for i in range(50)] + ["200000-", "!10-20", "7"])
+
+
+# ======================================================================================
+# Worker: one dataset, every stage
+# ======================================================================================
+
+def _timed(fn, repeat: int) -> tuple[dict, object]:
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    stats = {
+        'median_ms': round(float(np.median(times)), 3),
+        'p95_ms': round(float(np.percentile(times, 95)), 3),
+        'n': repeat,
+    }
+    return stats, result
+
+
+def run_stages(db_path: str, repeat: int = DEFAULT_REPEAT, apptest: bool = False) -> dict:
+    """
+    Time every dashboard stage against db_path. LATENCY_DB must already point at
+    db_path when the latency_* modules are imported (the worker process sets it).
+    """
+    from sqlalchemy import create_engine
+    from streamlit.elements.arrow import marshall
+    from streamlit.proto.ArrowData_pb2 import ArrowData
+
+    from latency_data import DIMENSION_COLUMNS, IncrementalLoader, count_filtered, facet_counts, query_page
+    from latency_display import display_columns_map, highlight_latency_column
+    from latency_export import excel_bytes, stream_bytes
+    from latency_filters import BitmapIndex, id_interval_flags, ordered_rows, parse_id_ranges, sort_order
+
+    engine = create_engine(f'sqlite:///{db_path}')
+    stages = {}
+
+    stages['load_data'], df = _timed(lambda: IncrementalLoader(engine).refresh()[0], repeat)
+    stages['bitmap_index'], index = _timed(lambda: BitmapIndex(df), repeat)
+
+    # A typical cascade: most common product, then a frame size inside it
+    product = df['product_name'].value_counts().index[0]
+    frame = df.loc[df['product_name'] == product, 'frame_size'].value_counts().index[0]
+    two_filters = {'product_name': [product], 'frame_size': [frame]}
+    stages['options'], (_, mask) = _timed(lambda: index.facets(two_filters, index.all_rows), repeat)
+
+    # All 12 filters, each set to the value of one existing row so the result is not empty
+    row = df.iloc[len(df) // 2]
+    twelve = {c: [row[c]] for c in DIMENSION_COLUMNS if not isinstance(row[c], float)}
+    stages['filter_12'], _ = _timed(lambda: index.rows(index.facets(twelve, index.all_rows)[1]), repeat)
+
+    def id_filter():
+        include, exclude = parse_id_ranges(ID_INPUT)
+        return id_interval_flags(df['id'].to_numpy(), include, exclude)
+    stages['id_parse'], _ = _timed(id_filter, repeat)
+
+    # Sort order is built once per frame version and column; the page slice runs every rerun
+    flags = index.flags(mask)
+    stages['sort_order'], order = _timed(lambda: sort_order(df, 'result'), repeat)
+    stages['page'], page = _timed(lambda: df.take(ordered_rows(order, flags, True)[:PAGE_SIZE]), repeat)
+
+    display = page.rename(columns=display_columns_map)
+    stages['payload'], _ = _timed(
+        lambda: marshall(ArrowData(), highlight_latency_column(display, threshold=20.0), 'bench'), repeat
+    )
+
+    stages['sql_facets'], _ = _timed(lambda: facet_counts(engine, two_filters), repeat)
+    stages['sql_page'], _ = _timed(
+        lambda: (count_filtered(engine, two_filters),
+                 query_page(engine, list(df.columns), two_filters, sort_column='result', descending=True,
+                            page_size=PAGE_SIZE)),
+        repeat,
+    )
+
+    export_df = df[flags].head(EXPORT_ROWS).rename(columns=display_columns_map)
+    stages['xlsx_export'], _ = _timed(lambda: excel_bytes(export_df), max(1, repeat // 2))
+    stages['csv_export'], _ = _timed(lambda: stream_bytes('CSV', export_df), repeat)
+
+    if apptest:
+        stages.update(_apptest_stages(repeat, frame))
+
+    return {
+        'rows': len(df),
+        'matching_rows': int(flags.sum()),
+        'export_rows': len(export_df),
+        'stages': stages,
+        'peak_rss_bytes': peak_rss_bytes(),
+    }
+
+
+def _apptest_stages(repeat: int, frame_size: str) -> dict:
+    # Whole script runs, as a browser session would trigger them (Frame Size is the last filter)
+    from streamlit.testing.v1 import AppTest
+
+    stages = {}
+    at = AppTest.from_file(DASHBOARD_PATH, default_timeout=600)
+    stages['apptest_first_run'], _ = _timed(at.run, 1)
+
+    def toggle_filter():
+        frame_filter = at.multiselect[-1]
+        if frame_filter.value:
+            frame_filter.unselect(frame_size).run()
+        else:
+            frame_filter.select(frame_size).run()
+    stages['apptest_filter_rerun'], _ = _timed(toggle_filter, repeat)
+    return stages
+
+
+# ======================================================================================
+# Runner, storage, comparison
+# ======================================================================================
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _versions() -> dict:
+    import pandas
+    import streamlit
+    return {
+        'python': platform.python_version(),
+        'pandas': pandas.__version__,
+        'numpy': np.__version__,
+        'streamlit': streamlit.__version__,
+        'platform': platform.platform(),
+    }
+
+
+def run_size(db_path: str, repeat: int, apptest: bool) -> dict:
+    # AppTest reruns would otherwise fill the dashboard's own perf log
+    env = dict(os.environ, LATENCY_DB=os.path.abspath(db_path), LATENCY_PERF_LOG=os.devnull)
+    cmd = [sys.executable, os.path.abspath(__file__), '--worker', db_path, '--repeat', str(repeat)]
+    if apptest:
+        cmd.append('--apptest')
+    proc = subprocess.run(cmd, capture_output=True, text=True, env=env)
+    if proc.returncode != 0:
+        raise RuntimeError(f"benchmark worker failed for {db_path}:\n{proc.stderr}")
+    # The worker's last stdout line is its JSON result (Streamlit may log before it)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def print_table(results: list[dict]) -> None:
+    stages = list(dict.fromkeys(s for r in results for s in r['stages']))
+    print(f"{'stage':22}" + "".join(f"{r['size']:>22}" for r in results))
+    for stage in stages:
+        cells = []
+        for r in results:
+            s = r['stages'].get(stage)
+            cells.append(f"{s['median_ms']:>10,.1f} / {s['p95_ms']:>9,.1f}" if s else f"{'-':>22}")
+        print(f"{stage:22}" + "".join(cells))
+    print(f"{'peak RSS (MB)':22}" + "".join(
+        f"{(r['peak_rss_bytes'] or 0) / 1e6:>22,.0f}" for r in results
+    ))
+    print("(median / p95 ms)")
+
+
+def load_runs(path: str = RESULTS_PATH) -> list[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(old: dict, new: dict) -> None:
+    print(f"old: {old['ts']} {old.get('commit')} {old.get('label') or ''}")
+    print(f"new: {new['ts']} {new.get('commit')} {new.get('label') or ''}")
+    old_sizes = {r['size']: r for r in old['results']}
+    for result in new['results']:
+        before = old_sizes.get(result['size'])
+        if before is None:
+            continue
+        print(f"\n[{result['size']}]  median ms: old -> new (new/old)")
+        for stage, stats in result['stages'].items():
+            prev = before['stages'].get(stage)
+            if prev:
+                ratio = stats['median_ms'] / prev['median_ms'] if prev['median_ms'] else float('nan')
+                print(f"  {stage:22}{prev['median_ms']:>10,.1f} -> {stats['median_ms']:>10,.1f}  ({ratio:.2f}x)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard's stages on synthetic DBs")
+    parser.add_argument('--sizes', nargs='+', help="e.g. 10k 100k 1M (default: every DB in --data-dir)")
+    parser.add_argument('--data-dir', default=OUT_DIR, help="where synthetic_db.py wrote the DBs")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="timed runs per stage")
+    parser.add_argument('--apptest', action='store_true', help="also time full AppTest reruns")
+    parser.add_argument('--label', default='', help="note stored with the results")
+    parser.add_argument('--results', default=RESULTS_PATH, help="JSON-lines file the runs are appended to")
+    parser.add_argument('--compare', action='store_true', help="compare the last two stored runs and exit")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_stages(args.worker, args.repeat, args.apptest)))
+        return
+
+    if args.compare:
+        runs = load_runs(args.results)
+        if len(runs) < 2:
+            sys.exit("Need at least two stored runs to compare.")
+        compare(runs[-2], runs[-1])
+        return
+
+    if args.sizes:
+        paths = [output_path(parse_size(s), args.data_dir) for s in args.sizes]
+    else:
+        paths = sorted(glob.glob(os.path.join(args.data_dir, 'latency_results_*.db')), key=os.path.getsize)
+    missing = [p for p in paths if not os.path.exists(p)]
+    if missing or not paths:
+        sys.exit(f"Missing datasets {missing or args.data_dir}: run synthetic_db.py first "
+                 f"(sizes: {', '.join(SIZES)}).")
+
+    results = []
+    for path in paths:
+        size = os.path.basename(path)[len('latency_results_'):-len('.db')]
+        print(f"⏱️ {size} ...", flush=True)
+        results.append({'size': size, **run_size(path, args.repeat, args.apptest)})
+
+    print_table(results)
+    run = {
+        'ts': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'label': args.label,
+        'repeat': args.repeat,
+        'page_size': PAGE_SIZE,
+        'export_cap_rows': EXPORT_ROWS,
+        'versions': _versions(),
+        'results': results,
+    }
+    with open(args.results, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(run) + '\n')
+    print(f"✅ Stored in {args.results}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,521 +2,761 @@ import streamlit as st
 st.set_page_config(page_title="Latency Test Results", page_icon="🔝", layout="wide", initial_sidebar_state="expanded")
 
 import os
+import numpy as np
 import pandas as pd
 from sqlalchemy import create_engine
-from PIL import Image
-import io
-
-# --- DB Connection ---
-DB_PATH = os.path.join(os.path.dirname(__file__), 'latency_results.db')
-engine = create_engine(f'sqlite:///{DB_PATH}')
-
-@st.cache_data
-def load_data():
-    df = pd.read_sql('SELECT * FROM test_results', engine)
-
-    # Format datetime
-    if 'datetime' in df.columns:
-        df['datetime'] = pd.to_datetime(df['datetime']).dt.strftime('%Y-%m-%d %H:%M:%S')
-
-    # Convert result to numeric
-    if 'result' in df.columns:
-        df['result'] = pd.to_numeric(df['result'], errors='coerce')
-
-    # Drop unused columns
-    df = df.drop(columns=[col for col in ['step'] if col in df.columns])
-
-    desired_order = [
-        'product_name',
-        'frame_size',
-        'result',
-        'uplink_transceiver',
-        'firmware_version',
-        'system_mode',
-        'client_service_type',
-        'client_fec_mode',
-        'uplink_service_type',
-        'uplink_fec_mode',
-        'modulation_format',
-        'datetime',
-        'serial_number',
-        'part_number',
-        'hardware_version',
-        'traffic_generator_application',
-        'id',
-    ]
-
-    # desired_order = [
-    #     'id',
-    #     'product_name',
-    #     'datetime',
-    #     'serial_number',
-    #     'part_number',
-    #     'hardware_version',
-    #     'firmware_version',
-    #     'traffic_generator_application',
-    #     'system_mode',
-    #     'client_service_type',
-    #     'client_fec_mode',
-    #     'uplink_service_type',
-    #     'uplink_fec_mode',
-    #     'modulation_format',
-    #     'uplink_transceiver',
-    #     'frame_size',
-    #     'result',
-    # ]
-
-    df = df[[c for c in desired_order if c in df.columns]]
-    return df
-
-df = load_data()
-
-# --- Display logo above title ---
-logo_path = os.path.join(os.path.dirname(__file__), 'Packetlight Logo.png')
-st.image(Image.open(logo_path), width=250)
-st.title("PacketLight - Latency Results")
-st.subheader("(The measurement was taken using a setup with 2 devices)")
-
-# --- Define renamed display columns ---
-display_columns_map = {
-    'id': 'ID',
-    'product_name': 'Product Name',
-    'datetime': 'Date & Time',
-    'serial_number': 'Serial Number',
-    'part_number': 'Part Number',
-    'hardware_version': 'Hardware Version',
-    'firmware_version': 'Firmware Version',
-    'traffic_generator_application': 'Traffic Generator Application',
-    'system_mode': 'System Mode',
-    'client_service_type': 'Client Service Type',
-    'client_fec_mode': 'Client FEC Mode',
-    'uplink_service_type': 'Uplink Service Type',
-    'uplink_fec_mode': 'Uplink FEC Mode',
-    'modulation_format': 'Modulation Format',
-    'uplink_transceiver': 'Uplink Transceiver',
-    'frame_size': 'Frame Size',
-    'result': 'Latency (uSecs)'
-}
-
-
-def highlight_latency_column(df):
-    return df.style.apply(
-        lambda _: ['background-color: #C6EFCE'] * len(df),
-        subset=['Latency (uSecs)']
-    )
+from sqlalchemy.exc import SQLAlchemyError
+import hashlib
+import json
+import pickle
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from latency_data import (
+    DB_PATH,
+    DESIRED_ORDER,
+    IncrementalLoader,
+    LAZY_COLUMNS,
+    ValueDictionary,
+    count_filtered,
+    db_change_signal,
+    facet_counts,
+    frame_nbytes,
+    load_view,
+    page_cursor,
+    query_filtered,
+    query_page,
+    save_view,
+    table_columns,
+)
+from latency_display import CLOSE_ON_SELECT_JS, FILTER_KEYS, LATENCY_COLUMN, display_columns_map, highlight_latency_column
+from latency_export import STREAM_FORMATS, excel_bytes, stream_bytes
+from latency_filters import BitmapIndex, id_interval_flags, ordered_rows, parse_id_ranges, sort_order
+from latency_perf import PERF_LOG_PATH, PhaseTimer, log_phases, save_profile, start_profiler, top_functions
+from latency_url import LIST_KEYS, TEXT_KEYS, canonical_state, decode_state, encode_state, resolve_bitsets, view_hash
+
+# --- Opt-in profiler: ?profile=1 profiles this whole rerun; without it only this check runs ---
+profile_requested = st.query_params.get("profile") == "1"
+profiler = start_profiler() if profile_requested else None
 
 # ======================================================================================
-# Query-params persistence helpers (survive F5 refresh)
+# Per-rerun phase timing (shown under "Performance" in the sidebar, logged to PERF_LOG_PATH)
 # ======================================================================================
-
-QP = st.query_params  # dict-like
-
-def qp_get_list(key: str) -> list[str]:
-    if key not in QP:
-        return []
-    val = QP.get(key)
-    if isinstance(val, list):
+perf = PhaseTimer(trace_memory=st.session_state.get("perf_trace_memory", False))
+
+
+def main() -> None:
+    # --- DB Connection ---
+    engine = create_engine(f'sqlite:///{DB_PATH}')
+
+    @st.cache_resource
+    def get_loader():
+        # One loader per server process; it keeps the parsed frame between reruns
+        return IncrementalLoader(engine)
+
+    def load_data(extra_columns=()):
+        # (frame, version): the shared frame itself - no per-session copy, never written to; filters only
+        # produce row positions
+        return get_loader().refresh(extra_columns)
+
+    def lazy_columns_shown() -> list:
+        # LAZY_COLUMNS this session's table shows: its checkboxes, or the URL before they exist
+        cols_from_url = qp_get_list("cols")
+        shown = []
+        for column in LAZY_COLUMNS:
+            label = display_columns_map.get(column, column)
+            ticked = st.session_state.get(f"col_{label}__rt{reset_token}")
+            if ticked is None:
+                ticked = label in cols_from_url
+            if ticked:
+                shown.append(column)
+        return shown
+
+    @st.cache_resource(max_entries=2)
+    def get_bitmap_index(_df: pd.DataFrame, data_version: int) -> BitmapIndex:
+        # Rebuilt only when the loader hands out a new frame
+        return BitmapIndex(_df)
+
+    @st.cache_resource(max_entries=8)
+    def get_sort_order(_df: pd.DataFrame, data_version: int, column: str) -> np.ndarray:
+        order = sort_order(_df, column)
+        order.flags.writeable = False
+        return order
+
+    # --- SQL pushdown helpers (cached per DB change signal) ---
+    @st.cache_data(max_entries=256)
+    def sql_facets(selections: dict, id_ranges: list, id_excludes: list, latency_filter_type: str,
+                   latency_threshold: float, change_signal: tuple) -> dict:
+        return facet_counts(engine, selections, id_ranges, id_excludes, latency_filter_type, latency_threshold)
+
+    @st.cache_data(max_entries=256)
+    def sql_count(selections: dict, id_ranges: list, id_excludes: list, latency_filter_type: str,
+                  latency_threshold: float, change_signal: tuple) -> int:
+        return count_filtered(engine, selections, id_ranges, id_excludes, latency_filter_type, latency_threshold)
+
+    @st.cache_data
+    def sql_table_columns(change_signal: tuple) -> list:
+        return table_columns(engine)
+
+    def session_state_nbytes() -> int:
+        # Pickled size of what this session keeps between reruns
+        total = 0
+        for value in st.session_state.to_dict().values():
+            try:
+                total += len(pickle.dumps(value))
+            except Exception:
+                pass
+        return total
+
+    # --- Display logo above title ---
+    logo_path = os.path.join(os.path.dirname(__file__), 'Packetlight Logo.png')
+
+    @st.cache_resource
+    def logo_bytes() -> bytes:
+        # Read once per server process, not on every rerun
+        with open(logo_path, 'rb') as f:
+            return f.read()
+
+    st.image(logo_bytes(), width=250)
+    st.title("PacketLight - Latency Results")
+    st.subheader("(The measurement was taken using a setup with 2 devices)")
+
+    # ======================================================================================
+    # URL state (survives F5 refresh): one compact ?s= token, or a ?v= short link
+    # ======================================================================================
+
+    QP = st.query_params  # dict-like
+
+    @st.cache_resource
+    def get_value_dictionary():
+        # One per server process, extended as rows arrive
+        return ValueDictionary(engine)
+
+    def url_dictionary() -> dict:
+        # What the ?s= bitsets point into: filter values by first appearance, columns in DESIRED_ORDER
+        values = get_value_dictionary().refresh()
+        dictionary = {qp_key: values[column] for qp_key, _, column, _ in FILTER_KEYS}
+        dictionary["cols"] = [display_columns_map.get(c, c) for c in DESIRED_ORDER]
+        return dictionary
+
+    def _legacy_list(key: str) -> list[str]:
+        val = QP.get_all(key)
         out = []
         for x in val:
             out.extend([p for p in str(x).split(",") if p != ""])
         return out
-    return [p for p in str(val).split(",") if p != ""]
-
-def qp_get_str(key: str, default: str = "") -> str:
-    if key not in QP:
-        return default
-    val = QP.get(key)
-    if isinstance(val, list):
-        return str(val[0]) if val else default
-    return str(val)
-
-def qp_get_float(key: str, default: float = 0.0) -> float:
-    s = qp_get_str(key, "")
-    try:
-        return float(s)
-    except Exception:
-        return default
-
-def qp_set_list(key: str, values: list) -> None:
-    if values:
-        QP[key] = ",".join([str(x) for x in values])
-    else:
-        QP.pop(key, None)
-
-def qp_set_str(key: str, value: str, default: str = "") -> None:
-    if value is None or value == default:
-        QP.pop(key, None)
-    else:
-        QP[key] = str(value)
-
-def qp_set_float(key: str, value: float, default: float = 0.0) -> None:
-    if value is None or float(value) == float(default):
-        QP.pop(key, None)
-    else:
-        QP[key] = str(float(value))
-
-# Defaults
-DEFAULT_LAT_FILTER = "Show All"
-DEFAULT_LAT_THRESHOLD = 0.0
-
-# ======================================================================================
-# Widget remount token (reset button)
-# ======================================================================================
-if "reset_token" not in st.session_state:
-    st.session_state["reset_token"] = 0
-
-reset_token = st.session_state["reset_token"]
-
-# ======================================================================================
-# Auto-close multiselect: remount-on-change + keep selection in stable session_state
-# ======================================================================================
-
-FILTER_KEYS = [
-    ("product", "sel_product"),
-    ("hw", "sel_hw"),
-    ("fw", "sel_fw"),
-    ("tg", "sel_tg"),
-    ("mode", "sel_mode"),
-    ("client", "sel_client"),
-    ("client_fec", "sel_client_fec"),
-    ("uplink", "sel_uplink"),
-    ("uplink_fec", "sel_uplink_fec"),
-    ("mod", "sel_mod"),
-    ("uplink_tr", "sel_uplink_tr"),
-    ("frame", "sel_frame"),
-]
-
-def multiselect_autoclose(label: str, options: list, qp_key: str, state_key: str):
-    """
-    Multiselect that closes after any change by remounting (key changes).
-    Selected values are stored in st.session_state[state_key].
-    """
-    tok_key = f"__tok__{state_key}__rt{reset_token}"
-
-    if tok_key not in st.session_state:
-        st.session_state[tok_key] = 0
-
-    # Initialize from query params only once
-    if state_key not in st.session_state:
-        st.session_state[state_key] = [x for x in qp_get_list(qp_key) if x in options]
-
-    # Keep only values that still exist in current options
-    current = [x for x in st.session_state[state_key] if x in options]
-    st.session_state[state_key] = current
-
-    widget_key = f"{state_key}__w__rt{reset_token}__{st.session_state[tok_key]}"
-
-    def _on_change():
-        new_values = st.session_state.get(widget_key, [])
-        st.session_state[state_key] = new_values
-        qp_set_list(qp_key, new_values)   # update query params immediately
-        # st.session_state[tok_key] += 1    # force remount => closes dropdown
-        st.session_state[tok_key] = st.session_state.get(tok_key, 0) + 1
-
-    return st.multiselect(
-        label,
-        options,
-        default=current,
-        key=widget_key,
-        on_change=_on_change
-    )
 
-# ======================================================================================
-# Reset mechanism for Streamlit 1.40.1
-# ======================================================================================
-
-def _mark_reset():
-    st.session_state["_do_reset"] = True
+    # Read the URL once per session; widgets and helpers below work on url_state
+    if "url_state" not in st.session_state:
+        url_state = {}
+        st.session_state["url_view"] = None
+        try:
+            if "v" in QP:
+                saved = load_view(engine, QP.get("v"))
+                if saved is None:
+                    raise ValueError("unknown short link")
+                url_state = json.loads(saved)
+                st.session_state["url_view"] = (QP.get("v"), canonical_state(url_state))
+            elif "s" in QP:
+                texts, bitsets, fingerprint = decode_state(QP.get("s"))
+                url_state = {**texts, **resolve_bitsets(bitsets, fingerprint, url_dictionary())}
+            else:
+                # Links from before ?s=: one comma-joined parameter per key
+                url_state = {key: _legacy_list(key) for key in LIST_KEYS if _legacy_list(key)}
+                url_state.update({key: QP.get(key) for key in TEXT_KEYS if QP.get(key)})
+        except ValueError:
+            st.warning("🔗 This link no longer matches the data (or is damaged); its filters could not be restored.")
+        st.session_state["url_state"] = url_state
+    url_state = st.session_state["url_state"]
 
-if st.session_state.get("_do_reset", False):
-    st.session_state["_do_reset"] = False
+    def qp_get_list(key: str) -> list[str]:
+        return list(url_state.get(key, []))
 
-    # clear URL query params
-    st.query_params.clear()
+    def qp_get_str(key: str, default: str = "") -> str:
+        return str(url_state.get(key, default))
 
-    # clear stable selections + tokens for the auto-close widgets
-    for _, state_key in FILTER_KEYS:
-        st.session_state.pop(state_key, None)
-        # remove all tokens keys for this reset token (safe)
-        for k in list(st.session_state.keys()):
-            if k.startswith(f"__tok__{state_key}__"):
-                st.session_state.pop(k, None)
+    def qp_get_float(key: str, default: float = 0.0) -> float:
+        s = qp_get_str(key, "")
+        try:
+            return float(s)
+        except Exception:
+            return default
 
-    # increment token so ALL widgets remount with fresh state
-    st.session_state["reset_token"] += 1
+    def qp_set_list(key: str, values: list) -> None:
+        if values:
+            url_state[key] = [str(x) for x in values]
+        else:
+            url_state.pop(key, None)
 
-    st.rerun()
+    def qp_set_str(key: str, value: str, default: str = "") -> None:
+        if value is None or value == default:
+            url_state.pop(key, None)
+        else:
+            url_state[key] = str(value)
 
-# ======================================================================================
-# Sidebar
-# ======================================================================================
-with st.sidebar:
-    st.subheader("Contact: Yuval Dahan")
-    st.button("🔄 Reset Button", on_click=_mark_reset, use_container_width=True)
-    st.header("🔍 Filters")
-
-    filtered_options_df = df.copy()
-
-    # ---- 1) Product ----
-    product_options = sorted(df['product_name'].dropna().unique())
-    selected_product = multiselect_autoclose("Product Name", product_options, "product", "sel_product")
-    if selected_product:
-        filtered_options_df = filtered_options_df[filtered_options_df['product_name'].isin(selected_product)]
-
-    # ---- 2) HW ----
-    hw_options = sorted(filtered_options_df['hardware_version'].dropna().unique())
-    selected_hw = multiselect_autoclose("Hardware Version", hw_options, "hw", "sel_hw")
-    if selected_hw:
-        filtered_options_df = filtered_options_df[filtered_options_df['hardware_version'].isin(selected_hw)]
-
-    # ---- 3) FW ----
-    fw_options = sorted(filtered_options_df['firmware_version'].dropna().unique())
-    selected_fw = multiselect_autoclose("Firmware Version", fw_options, "fw", "sel_fw")
-    if selected_fw:
-        filtered_options_df = filtered_options_df[filtered_options_df['firmware_version'].isin(selected_fw)]
-
-    # ---- 4) Traffic app ----
-    tg_options = sorted(filtered_options_df['traffic_generator_application'].dropna().unique())
-    selected_traffic_app = multiselect_autoclose("Traffic Generator Application", tg_options, "tg", "sel_tg")
-    if selected_traffic_app:
-        filtered_options_df = filtered_options_df[filtered_options_df['traffic_generator_application'].isin(selected_traffic_app)]
-
-    # ---- 5) System Mode ----
-    mode_options = sorted(filtered_options_df['system_mode'].dropna().unique())
-    selected_mode = multiselect_autoclose("System Mode", mode_options, "mode", "sel_mode")
-    if selected_mode:
-        filtered_options_df = filtered_options_df[filtered_options_df['system_mode'].isin(selected_mode)]
-
-    # ---- 6) Client Service Type ----
-    client_options = sorted(filtered_options_df['client_service_type'].dropna().unique())
-    selected_client = multiselect_autoclose("Client Service Type", client_options, "client", "sel_client")
-    if selected_client:
-        filtered_options_df = filtered_options_df[filtered_options_df['client_service_type'].isin(selected_client)]
-
-    # ---- 7) Client FEC ----
-    client_fec_options = sorted(filtered_options_df['client_fec_mode'].dropna().unique())
-    selected_client_fec = multiselect_autoclose("Client FEC Mode", client_fec_options, "client_fec", "sel_client_fec")
-    if selected_client_fec:
-        filtered_options_df = filtered_options_df[filtered_options_df['client_fec_mode'].isin(selected_client_fec)]
-
-    # ---- 8) Uplink Service Type ----
-    uplink_options = sorted(filtered_options_df['uplink_service_type'].dropna().unique())
-    selected_uplink = multiselect_autoclose("Uplink Service Type", uplink_options, "uplink", "sel_uplink")
-    if selected_uplink:
-        filtered_options_df = filtered_options_df[filtered_options_df['uplink_service_type'].isin(selected_uplink)]
-
-    # ---- 9) Uplink FEC ----
-    uplink_fec_options = sorted(filtered_options_df['uplink_fec_mode'].dropna().unique())
-    selected_uplink_fec = multiselect_autoclose("Uplink FEC Mode", uplink_fec_options, "uplink_fec", "sel_uplink_fec")
-    if selected_uplink_fec:
-        filtered_options_df = filtered_options_df[filtered_options_df['uplink_fec_mode'].isin(selected_uplink_fec)]
-
-    # ---- 10) Modulation ----
-    modulation_options = sorted(filtered_options_df['modulation_format'].dropna().unique())
-    selected_modulation = multiselect_autoclose("Modulation Format", modulation_options, "mod", "sel_mod")
-    if selected_modulation:
-        filtered_options_df = filtered_options_df[filtered_options_df['modulation_format'].isin(selected_modulation)]
-
-    # ---- 11) Uplink Transceiver ----
-    uplink_tr_options = sorted(filtered_options_df['uplink_transceiver'].dropna().unique())
-    selected_uplink_transceiver = multiselect_autoclose("Uplink Transceiver", uplink_tr_options, "uplink_tr", "sel_uplink_tr")
-    if selected_uplink_transceiver:
-        filtered_options_df = filtered_options_df[filtered_options_df['uplink_transceiver'].isin(selected_uplink_transceiver)]
-
-    # ---- 12) Frame size ----
-    frame_options = sorted(filtered_options_df['frame_size'].dropna().unique())
-    selected_frame_size = multiselect_autoclose("Frame Size", frame_options, "frame", "sel_frame")
-    if selected_frame_size:
-        filtered_options_df = filtered_options_df[filtered_options_df['frame_size'].isin(selected_frame_size)]
-
-    # -------------------------------------------------------------------------------------------------- #
-    st.header("🆔 Filter by ID")
-    id_input_default = qp_get_str("ids", "")
-    id_input = st.text_input("Enter IDs (Comma separated or Ranges)", value=id_input_default, key=f"f_id_input__rt{reset_token}")
-    id_list = []
-    if id_input.strip():
+    def qp_set_float(key: str, value: float, default: float = 0.0) -> None:
+        if value is None or float(value) == float(default):
+            url_state.pop(key, None)
+        else:
+            url_state[key] = str(float(value))
+
+    def sync_url() -> None:
+        """
+        Write url_state to the address bar: the short link while the state is still the
+        saved view, otherwise one ?s= token (no parameter at all in the default state).
+        Nothing is sent unless that differs from what the URL already holds, and then
+        all of it goes as one update (one browser history entry).
+        """
+        view = st.session_state.get("url_view")
+        written = (canonical_state(url_state), view)
+        if st.session_state.get("url_written") == written:
+            return
+        st.session_state["url_written"] = written
+
+        if view and view[1] == written[0]:
+            params = {"v": [view[0]]}
+        elif url_state:
+            params = {"s": [encode_state(url_state, url_dictionary())]}
+        else:
+            params = {}
+        # Parameters the dashboard doesn't own (e.g. ?profile=1) stay; pre-?s= ones are dropped
+        owned = set(LIST_KEYS + TEXT_KEYS + ["s", "v"])
+        current = {key: QP.get_all(key) for key in QP}
+        wanted = {key: values for key, values in current.items() if key not in owned} | params
+        if wanted != current:
+            QP.from_dict(wanted)
+
+    # Defaults
+    DEFAULT_LAT_FILTER = "Show All"
+    DEFAULT_LAT_THRESHOLD = 0.0
+    QUERY_MODES = ["In-Memory", "SQL Pushdown"]
+    DEFAULT_QUERY_MODE = "In-Memory"
+
+    # ======================================================================================
+    # Widget remount token (reset button)
+    # ======================================================================================
+    if "reset_token" not in st.session_state:
+        st.session_state["reset_token"] = 0
+
+    reset_token = st.session_state["reset_token"]
+
+    # ======================================================================================
+    # Auto-close multiselect: closed on the client, selection kept in stable session_state
+    # ======================================================================================
+
+    close_on_select = st.components.v2.component("multiselect_close_on_select", js=CLOSE_ON_SELECT_JS)
+
+    def multiselect_autoclose(label: str, options: list, qp_key: str, state_key: str, format_func=str):
+        """
+        Multiselect whose dropdown closes after any change (see CLOSE_ON_SELECT_JS).
+        Selected values are stored in st.session_state[state_key].
+        """
+        # One key per filter until the next reset: values no longer in options are dropped
+        # by the widget itself, so it never has to be remounted
+        widget_key = f"{state_key}__w__rt{reset_token}"
+
+        # Initialize from query params only once
+        if state_key not in st.session_state:
+            st.session_state[state_key] = [x for x in qp_get_list(qp_key) if x in options]
+
+        # Keep only values that still exist in current options
+        current = [x for x in st.session_state[state_key] if x in options]
+
+        def _on_change():
+            new_values = st.session_state.get(widget_key, [])
+            st.session_state[state_key] = new_values
+            qp_set_list(qp_key, new_values)   # written to the URL at the end of this rerun
+
+        values = st.multiselect(
+            label,
+            options,
+            default=current,
+            format_func=format_func,
+            key=widget_key,
+            on_change=_on_change
+        )
+        st.session_state[state_key] = values
+        return values
+
+    # ======================================================================================
+    # Reset mechanism for Streamlit 1.40.1
+    # ======================================================================================
+
+    def _mark_reset():
+        st.session_state["_do_reset"] = True
+
+    if st.session_state.get("_do_reset", False):
+        st.session_state["_do_reset"] = False
+
+        # clear URL query params (and the state read from them)
+        st.query_params.clear()
+        st.session_state.pop("url_state", None)
+        st.session_state.pop("url_written", None)
+
+        # clear stable selections for the auto-close widgets
+        for _, state_key, _, _ in FILTER_KEYS:
+            st.session_state.pop(state_key, None)
+
+        # increment token so ALL widgets remount with fresh state
+        st.session_state["reset_token"] += 1
+
+        st.rerun()
+
+    # ======================================================================================
+    # Sidebar
+    # ======================================================================================
+    with st.sidebar:
+        st.subheader("Contact: Yuval Dahan")
+        st.button("🔄 Reset Button", on_click=_mark_reset, use_container_width=True)
+        if st.button("🔗 Short Link", use_container_width=True,
+                     help="Save the current filters and columns under a short ?v= link"):
+            link_hash = view_hash(url_state)
+            try:
+                save_view(engine, link_hash, canonical_state(url_state))
+            except (RuntimeError, SQLAlchemyError) as e:
+                st.error(f"Could not save the link: {e}")
+            else:
+                # The address bar switches to the short link too (see sync_url)
+                st.session_state["url_view"] = (link_hash, canonical_state(url_state))
+                st.code(urlsplit(st.context.url or "")._replace(query=f"v={link_hash}").geturl(), language=None)
+        st.header("🗃️ Query Mode")
+        query_mode_default = qp_get_str("query", DEFAULT_QUERY_MODE)
+        if query_mode_default not in QUERY_MODES:
+            query_mode_default = DEFAULT_QUERY_MODE
+        query_mode = st.radio(
+            "Apply filters:",
+            QUERY_MODES,
+            horizontal=True,
+            index=QUERY_MODES.index(query_mode_default),
+            key=f"f_query_mode__rt{reset_token}",
+            help="SQL Pushdown runs the filters inside SQLite and fetches only the matching rows "
+                 "and displayed columns, instead of filtering a full in-memory copy of the table.",
+        )
+        use_sql = query_mode == "SQL Pushdown"
+
+        st.header("🔍 Filters")
+
+        with perf.phase("load_data"):
+            if use_sql:
+                change_signal = db_change_signal(DB_PATH)
+                df = None
+            else:
+                # The version comes with the frame: loader.version may already belong to a
+                # reload by another session, and this run (and its fragments) keep this df
+                df, data_version = load_data(lazy_columns_shown())
+                loader = get_loader()
+                bitmap_index = get_bitmap_index(df, data_version)
+        if not use_sql:
+            st.caption(
+                f"🗄️ Data reloaded {datetime.fromtimestamp(loader.last_reload).strftime('%Y-%m-%d %H:%M:%S')}"
+                f" · cache hit rate {loader.hit_rate:.0%} ({loader.hits}/{loader.hits + loader.reloads})"
+            )
+            if not loader.incremental:
+                st.caption("⚠️ Full-reload mode: every DB change reloads the whole table. "
+                           "Run `python migrations.py` to load only the new rows.")
+            # Filled in once this rerun's working set is known (after the table)
+            memory_box = st.empty()
+
+        # Filled in below: the ID / latency inputs feed the option counts
+        filters_box = st.container()
+
+        # -------------------------------------------------------------------------------------------------- #
+        st.header("🆔 Filter by ID")
+        id_input_default = qp_get_str("ids", "")
+        id_input = st.text_input(
+            "Enter IDs (Comma separated or Ranges)",
+            value=id_input_default,
+            key=f"f_id_input__rt{reset_token}",
+            help="e.g. 1, 3, 5-10 · open ended: 2000- or -50 · exclude: !10-20",
+        )
+        id_ranges, id_excludes = [], []
+        if id_input.strip():
+            try:
+                id_ranges, id_excludes = parse_id_ranges(id_input)
+            except ValueError:
+                st.warning("Please enter valid integers or ranges (e.g., 1, 3, 5-10, 2000-, !10-20).")
+
+        # -------------------------------------------------------------------------------------------------- #
+        st.header("⏱️ Latency Filter (μSec)")
+        lat_type_default = qp_get_str("lat_type", "Show All")
+        if lat_type_default not in ["Show All", "Above", "Below"]:
+            lat_type_default = "Show All"
+
+        latency_filter_type = st.radio(
+            "Filter by Latency:",
+            ["Show All", "Above", "Below"],
+            horizontal=True,
+            index=["Show All", "Above", "Below"].index(lat_type_default),
+            key=f"f_lat_type__rt{reset_token}"
+        )
+        latency_threshold_default = qp_get_float("lat_th", 0.0)
+        latency_threshold = st.number_input(
+            "Latency Threshold (μSec)",
+            min_value=0.0,
+            step=0.1,
+            value=float(latency_threshold_default),
+            key=f"f_lat_thresh__rt{reset_token}"
+        )
+
+        # -------------------------------------------------------------------------------------------------- #
+        # Faceted filters: every option list is computed under all the *other* active filters
+        for qp_key, state_key, _, _ in FILTER_KEYS:
+            if state_key not in st.session_state:
+                st.session_state[state_key] = qp_get_list(qp_key)
+        selections = {column: list(st.session_state[state_key]) for _, state_key, column, _ in FILTER_KEYS}
+
+        with perf.phase("options"):
+            if not use_sql:
+                base_mask = bitmap_index.all_rows
+                if id_ranges or id_excludes:
+                    base_mask = base_mask & bitmap_index.pack(id_interval_flags(df['id'].to_numpy(), id_ranges, id_excludes))
+                if latency_filter_type == "Above":
+                    base_mask = base_mask & bitmap_index.pack(df['result'].to_numpy() > latency_threshold)
+                elif latency_filter_type == "Below":
+                    base_mask = base_mask & bitmap_index.pack(df['result'].to_numpy() < latency_threshold)
+
+            if use_sql:
+                facets = sql_facets(
+                    selections, id_ranges, id_excludes, latency_filter_type, latency_threshold, change_signal
+                )
+            else:
+                facets, row_mask = bitmap_index.facets(selections, base_mask)
+
+            with filters_box:
+                for qp_key, state_key, column, label in FILTER_KEYS:
+                    counts = facets.get(column, {})
+                    # A selected value with no rows left under the other filters stays, as "(0)":
+                    # dropping it would widen the results instead of narrowing them
+                    options = list(counts) + [v for v in selections[column] if v not in counts]
+                    selections[column] = multiselect_autoclose(
+                        label,
+                        options,
+                        qp_key,
+                        state_key,
+                        format_func=lambda value, counts=counts: f"{value} ({counts.get(value, 0):,})",
+                    )
+                close_on_select(key="multiselect_close_on_select", height=0)
+
+    # ======================================================================================
+    # Save current selections back into the URL (so F5 keeps state)
+    # ======================================================================================
+    for qp_key, _, column, _ in FILTER_KEYS:
+        qp_set_list(qp_key, selections[column])
+
+    qp_set_str("ids", id_input, default="")
+    qp_set_str("lat_type", latency_filter_type, default=DEFAULT_LAT_FILTER)
+    qp_set_float("lat_th", latency_threshold, default=DEFAULT_LAT_THRESHOLD)
+    qp_set_str("query", query_mode, default=DEFAULT_QUERY_MODE)
+    sync_url()
+
+    # ======================================================================================
+    # Apply filters
+    # ======================================================================================
+    filter_args = (selections, id_ranges, id_excludes, latency_filter_type, latency_threshold)
+    # Every column the table can show (in memory, LAZY_COLUMNS may not be loaded yet)
+    available_columns = loader.columns if df is not None else sql_table_columns(change_signal)
+
+    with perf.phase("filter"):
+        if use_sql:
+            total_rows = sql_count(*filter_args, change_signal)
+        else:
+            # row_mask already combines all sidebar filters (from the facet pass above)
+            row_flags = bitmap_index.flags(row_mask)
+            total_rows = int(np.count_nonzero(row_flags))
+
+    st.subheader(f"Showing {total_rows} Records")
+
+    # What the table fragment currently shows; read by the export panel and the download
+    # thread, so a column toggle (a table-only rerun) still reaches the next download
+    table_view = st.session_state.setdefault("table_view", {})
+
+    # ======================================================================================
+    # Results table: one page at a time, sorted server-side
+    # ======================================================================================
+    PAGE_SIZES = [25, 50, 100, 250, 500]
+    DEFAULT_PAGE_SIZE = 100
+
+    @st.fragment
+    def results_table(full_run: dict) -> dict:
+        """
+        Column chooser, sort / paging controls and the table. Its own widgets rerun only
+        this function; a filter change reruns the whole script and this with it.
+        """
+        # A full run merges these phases into the rerun's timer; a fragment rerun logs its own
+        timer = PhaseTimer(trace_memory=st.session_state.get("perf_trace_memory", False))
         try:
-            for part in id_input.split(","):
-                part = part.strip()
-                if not part:
-                    continue
-                if "-" in part:
-                    start_str, end_str = part.split("-", 1)
-                    start = int(start_str.strip())
-                    end = int(end_str.strip())
-                    if start <= end:
-                        id_list.extend(range(start, end + 1))
-                    else:
-                        id_list.extend(range(end, start + 1))
-                else:
-                    id_list.append(int(part))
-        except ValueError:
-            st.warning("Please enter valid integers or ranges (e.g., 1, 3, 5-10).")
-
-    # -------------------------------------------------------------------------------------------------- #
-    st.header("⏱️ Latency Filter (μSec)")
-    lat_type_default = qp_get_str("lat_type", "Show All")
-    if lat_type_default not in ["Show All", "Above", "Below"]:
-        lat_type_default = "Show All"
-
-    latency_filter_type = st.radio(
-        "Filter by Latency:",
-        ["Show All", "Above", "Below"],
-        horizontal=True,
-        index=["Show All", "Above", "Below"].index(lat_type_default),
-        key=f"f_lat_type__rt{reset_token}"
-    )
-    latency_threshold_default = qp_get_float("lat_th", 0.0)
-    latency_threshold = st.number_input(
-        "Latency Threshold (μSec)",
-        min_value=0.0,
-        step=0.1,
-        value=float(latency_threshold_default),
-        key=f"f_lat_thresh__rt{reset_token}"
-    )
-
-    # -------------------------------------------------------------------------------------------------- #
-    st.header("🧩 Columns to Display")
-    st.caption("Toggle columns on/off to display in the table:")
-
-    default_cols = list(df.rename(columns=display_columns_map).columns)
-    cols_from_qp = qp_get_list("cols")
-    if cols_from_qp:
-        cols_default = [c for c in cols_from_qp if c in default_cols] or default_cols
-    else:
-        cols_default = default_cols
-
-    checkbox_columns = {}
-    for col in default_cols:
-        checkbox_columns[col] = st.checkbox(col, value=(col in cols_default), key=f"col_{col}__rt{reset_token}")
-
-    selected_columns = [col for col, show in checkbox_columns.items() if show]
-
-# ======================================================================================
-# Save current selections back into query params (so F5 keeps state)
-# ======================================================================================
-qp_set_list("product", selected_product)
-qp_set_list("hw", selected_hw)
-qp_set_list("fw", selected_fw)
-qp_set_list("tg", selected_traffic_app)
-qp_set_list("mode", selected_mode)
-qp_set_list("client", selected_client)
-qp_set_list("client_fec", selected_client_fec)
-qp_set_list("uplink", selected_uplink)
-qp_set_list("uplink_fec", selected_uplink_fec)
-qp_set_list("mod", selected_modulation)
-qp_set_list("uplink_tr", selected_uplink_transceiver)
-qp_set_list("frame", selected_frame_size)
-
-qp_set_str("ids", id_input, default="")
-qp_set_str("lat_type", latency_filter_type, default=DEFAULT_LAT_FILTER)
-qp_set_float("lat_th", latency_threshold, default=DEFAULT_LAT_THRESHOLD)
-
-qp_set_list("cols", selected_columns)
-
-# ======================================================================================
-# Apply filters
-# ======================================================================================
-filtered_df = df.copy()
-
-if selected_product:
-    filtered_df = filtered_df[filtered_df['product_name'].isin(selected_product)]
-if selected_hw:
-    filtered_df = filtered_df[filtered_df['hardware_version'].isin(selected_hw)]
-if selected_fw:
-    filtered_df = filtered_df[filtered_df['firmware_version'].isin(selected_fw)]
-if selected_traffic_app:
-    filtered_df = filtered_df[filtered_df['traffic_generator_application'].isin(selected_traffic_app)]
-if selected_mode:
-    filtered_df = filtered_df[filtered_df['system_mode'].isin(selected_mode)]
-if selected_client:
-    filtered_df = filtered_df[filtered_df['client_service_type'].isin(selected_client)]
-if selected_client_fec:
-    filtered_df = filtered_df[filtered_df['client_fec_mode'].isin(selected_client_fec)]
-if selected_uplink:
-    filtered_df = filtered_df[filtered_df['uplink_service_type'].isin(selected_uplink)]
-if selected_uplink_fec:
-    filtered_df = filtered_df[filtered_df['uplink_fec_mode'].isin(selected_uplink_fec)]
-if selected_modulation:
-    filtered_df = filtered_df[filtered_df['modulation_format'].isin(selected_modulation)]
-if selected_uplink_transceiver:
-    filtered_df = filtered_df[filtered_df['uplink_transceiver'].isin(selected_uplink_transceiver)]
-if selected_frame_size:
-    filtered_df = filtered_df[filtered_df['frame_size'].isin(selected_frame_size)]
-if id_list:
-    filtered_df = filtered_df[filtered_df['id'].isin(id_list)]
-
-if latency_filter_type == "Above":
-    filtered_df = filtered_df[filtered_df['result'] > latency_threshold]
-elif latency_filter_type == "Below":
-    filtered_df = filtered_df[filtered_df['result'] < latency_threshold]
-
-display_df = filtered_df.rename(columns=display_columns_map)
-
-st.subheader(f"Showing {len(display_df)} Records")
-styled_df = highlight_latency_column(display_df[selected_columns])
-st.dataframe(styled_df, use_container_width=True)
-
-# =========================================== Download Options ============================================== #
-export_df = display_df[selected_columns]
-output = io.BytesIO()
-
-with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-    sheet_name = "Latency Results"
-    export_df.to_excel(writer, index=False, sheet_name=sheet_name, startrow=5)
-
-    workbook = writer.book
-    worksheet = writer.sheets[sheet_name]
-
-    logo_path = os.path.join(os.path.dirname(__file__), "Packetlight Logo.png")
-    worksheet.insert_image('A1', logo_path, {'x_scale': 0.5, 'y_scale': 0.5})
-
-    title_format = workbook.add_format({
-        'bold': True,
-        'font_size': 16,
-        'align': 'left',
-        'valign': 'vcenter'
-    })
-    worksheet.write('A4', 'PacketLight Latency Test Results', title_format)
-
-    header_format = workbook.add_format({
-        'bold': True,
-        'align': 'center',
-        'valign': 'vcenter',
-        'bg_color': '#D9E1F2',
-        'border': 1
-    })
-    for col_num, value in enumerate(export_df.columns.values):
-        worksheet.write(5, col_num, value, header_format)
-
-    cell_format = workbook.add_format({
-        'align': 'center',
-        'valign': 'vcenter',
-        'border': 1
-    })
-    for row in range(len(export_df)):
-        for col in range(len(export_df.columns)):
-            val = export_df.iloc[row, col]
-            if pd.isna(val):
-                worksheet.write(row + 6, col, "", cell_format)
+            return _results_table(full_run, timer)
+        finally:
+            # Also on st.rerun(scope="app") or an error: tracemalloc is process-wide
+            timer.stop()
+
+    def _results_table(full_run: dict, timer: PhaseTimer) -> dict:
+        all_cols = [display_columns_map.get(c, c) for c in available_columns]
+        default_cols = [display_columns_map.get(c, c) for c in available_columns if c not in LAZY_COLUMNS]
+        cols_from_qp = qp_get_list("cols")
+        if cols_from_qp:
+            cols_default = [c for c in cols_from_qp if c in all_cols] or default_cols
+        else:
+            cols_default = default_cols
+
+        columns_col, sort_col, order_col, size_col, page_col = st.columns([1, 3, 1, 1, 1], vertical_alignment="bottom")
+        with columns_col:
+            with st.popover("🧩 Columns to Display"):
+                st.caption("Toggle columns on/off to display in the table:")
+                checkbox_columns = {}
+                for col in all_cols:
+                    checkbox_columns[col] = st.checkbox(col, value=(col in cols_default), key=f"col_{col}__rt{reset_token}")
+        selected_columns = [col for col, show in checkbox_columns.items() if show]
+        selected_raw_columns = [c for c in available_columns if display_columns_map.get(c, c) in selected_columns]
+        qp_set_list("cols", selected_columns if selected_columns != default_cols else [])
+        if df is not None and not set(selected_raw_columns) <= set(df.columns):
+            # A hidden column was just ticked: the full rerun loads it into the shared frame
+            st.rerun(scope="app")
+        sync_url()
+        table_view.update(columns=selected_columns, raw_columns=selected_raw_columns)
+
+        with sort_col:
+            sort_options = selected_columns or ["ID"]
+            sort_label = st.selectbox("Sort by", sort_options, index=sort_options.index("ID") if "ID" in sort_options else 0,
+                                      key=f"sort_by__rt{reset_token}")
+        with order_col:
+            descending = st.toggle("Descending", key=f"sort_desc__rt{reset_token}")
+        with size_col:
+            page_size = st.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE),
+                                     key=f"page_size__rt{reset_token}")
+        n_pages = max(1, -(-total_rows // page_size))
+
+        sort_column = next((c for c in available_columns if display_columns_map.get(c, c) == sort_label), 'id')
+
+        # Back to the first page whenever the filters, sort or page size change
+        page_key = f"page__rt{reset_token}"
+        view_state = repr((filter_args, sort_column, descending, page_size))
+        if st.session_state.get("page_view_state") != view_state:
+            st.session_state["page_view_state"] = view_state
+            st.session_state[page_key] = 1
+
+        with page_col:
+            page = st.number_input(f"Page (of {n_pages:,})", min_value=1, step=1, key=page_key)
+        page = min(int(page), n_pages)
+
+        page_rows = None
+        with timer.phase("filter"):
+            if use_sql:
+                # Keyset cursors for the pages seen under this filter / sort state, so paging on
+                # never re-reads the rows before it; a direct jump seeds its cursor with one key-only OFFSET
+                cursor_state = repr((filter_args, sort_column, descending, page_size, change_signal))
+                if st.session_state.get("page_cursor_state") != cursor_state:
+                    st.session_state["page_cursor_state"] = cursor_state
+                    st.session_state["page_cursors"] = {1: None}
+                cursors = st.session_state["page_cursors"]
+                if page not in cursors:
+                    cursors[page] = page_cursor(engine, (page - 1) * page_size, sort_column, descending, *filter_args)
+                page_df, last_key = query_page(
+                    engine, selected_raw_columns, *filter_args,
+                    sort_column=sort_column, descending=descending, page_size=page_size, after=cursors[page],
+                )
+                if last_key is not None:
+                    cursors[page + 1] = last_key
             else:
-                worksheet.write(row + 6, col, val, cell_format)
-
-    for i, col in enumerate(export_df.columns):
-        col_max = export_df[col].map(lambda x: len(str(x)) if pd.notna(x) else 0).max()
-        if pd.isna(col_max):
-            max_len = len(str(col)) + 2
+                page_rows = ordered_rows(get_sort_order(df, data_version, sort_column), row_flags, descending)
+                page_df = df.take(page_rows[(page - 1) * page_size:page * page_size])[selected_raw_columns]
+
+        with timer.phase("rename"):
+            display_df = page_df.rename(columns=display_columns_map)
+
+        first_row = (page - 1) * page_size + 1 if total_rows else 0
+        st.caption(f"Rows {first_row:,}–{min(page * page_size, total_rows):,} of {total_rows:,}")
+        with timer.phase("styling"):
+            styled_df = highlight_latency_column(
+                display_df[selected_columns],
+                threshold=latency_threshold if latency_threshold > 0 else None,
+            )
+        with timer.phase("st.dataframe"):
+            st.dataframe(
+                styled_df,
+                use_container_width=True,
+                column_config={
+                    LATENCY_COLUMN: st.column_config.NumberColumn(
+                        help=f"Red: above the latency threshold ({latency_threshold:g} μSec)" if latency_threshold > 0 else None,
+                    ),
+                },
+            )
+
+        timer.stop()
+        view = {
+            'phases': timer.phases,
+            'selected_columns': selected_columns,
+            'sort_column': sort_column,
+            'descending': descending,
+            'page': page,
+            'page_size': page_size,
+            'rerun_bytes': (page_rows.nbytes if page_rows is not None else 0) + frame_nbytes(page_df),
+        }
+        if not full_run['active']:
+            try:
+                log_phases(
+                    timer.phases,
+                    event="table",
+                    total_ms=timer.total_ms,
+                    query_mode=query_mode,
+                    rows=total_rows,
+                    page_size=page_size,
+                    columns=len(selected_columns),
+                )
+            except OSError:
+                pass
+        return view
+
+    # The fragment keeps its arguments for its own reruns: the same dict, by then set to False
+    full_run = {'active': True}
+    table = results_table(full_run)
+    full_run['active'] = False
+    for entry in table['phases']:
+        perf.record(entry['phase'], entry['ms'] / 1000, entry['peak_bytes'])
+    selected_columns = table['selected_columns']
+
+    if not use_sql:
+        # What one more concurrent user costs on top of the shared frame + bitmap index
+        session_bytes = session_state_nbytes()
+        rerun_bytes = row_flags.nbytes + table['rerun_bytes']
+        memory_box.caption(
+            f"🧠 Shared dataset {(frame_nbytes(df) + bitmap_index.nbytes) / 1e6:,.1f} MB (one copy per server)"
+            f" · per extra user ≈ {(session_bytes + rerun_bytes) / 1e3:,.0f} KB"
+            f" ({session_bytes / 1e3:,.1f} KB session state + {rerun_bytes / 1e3:,.0f} KB per rerun)"
+        )
+
+    # =========================================== Download Options ============================================== #
+    def export_frame() -> pd.DataFrame:
+        # The whole filtered result (not just the page), in id order; only built on download
+        if use_sql:
+            filtered_df = query_filtered(engine, table_view['raw_columns'], *filter_args)
         else:
-            max_len = max(int(col_max), len(str(col))) + 2
-        worksheet.set_column(i, i, max_len)
-
-    worksheet.freeze_panes(6, 0)
-
-output.seek(0)
+            filtered_df = df.loc[row_flags, table_view['raw_columns']]
+        return filtered_df.rename(columns=display_columns_map)[table_view['columns']]
+
+    def export_key() -> str:
+        # Filter state / columns / data version, taken at click time
+        return hashlib.sha256(repr((
+            selections,
+            id_ranges,
+            id_excludes,
+            latency_filter_type,
+            latency_threshold,
+            table_view['columns'],
+            change_signal if use_sql else data_version,
+        )).encode()).hexdigest()
+
+    # Built only when the button is clicked (the callable runs on its own thread), and cached
+    # per export_key(), so a normal rerun never touches xlsxwriter
+    @st.cache_data(max_entries=8, show_spinner=False)
+    def cached_excel(export_key: str, _export_frame) -> bytes:
+        return excel_bytes(_export_frame())
+
+    EXPORT_FORMATS = ["Excel"] + list(STREAM_FORMATS)
+
+    # Filled from the download thread, shown on the next rerun (a plain dict, not session_state,
+    # because the callable runs outside the script thread)
+    last_download = st.session_state.setdefault("perf_last_download", {})
+
+    def timed_download(build, phase: str):
+        def run():
+            timer = PhaseTimer()
+            with timer.phase(phase):
+                data = build()
+            last_download.update(timer.phases[0], bytes=len(data))
+            try:
+                log_phases(timer.phases, event="download", query_mode=query_mode, rows=total_rows, bytes=len(data))
+            except OSError:
+                pass
+            return data
+        return run
+
+    @st.fragment
+    def export_panel() -> None:
+        # Switching the format reruns only this panel
+        format_col, button_col = st.columns([1, 3], vertical_alignment="bottom")
+        with format_col:
+            export_format = st.selectbox("Export format", EXPORT_FORMATS, key=f"export_format__rt{reset_token}")
+
+        with button_col:
+            if export_format == "Excel":
+                st.download_button(
+                    "Download Filtered Results - Excel File",
+                    data=timed_download(lambda: cached_excel(export_key(), export_frame), "Excel"),
+                    file_name="latency_results.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                )
+            else:
+                # Encoded chunk by chunk from a generator, and only on click
+                _, extension, mime = STREAM_FORMATS[export_format]
+                st.download_button(
+                    f"Download Filtered Results - {export_format} File",
+                    data=timed_download(lambda: stream_bytes(export_format, export_frame()), export_format),
+                    file_name=f"latency_results.{extension}",
+                    mime=mime,
+                )
+
+    export_panel()
+
+    # ======================================================================================
+    # Performance panel + structured log
+    # ======================================================================================
+    perf.stop()
+    total_ms = perf.total_ms
+
+    with st.sidebar:
+        with st.expander("⏱️ Performance"):
+            st.dataframe(
+                pd.DataFrame(perf.phases).assign(peak_mb=lambda t: t['peak_bytes'].astype(float) / 1e6)
+                                         .drop(columns='peak_bytes'),
+                hide_index=True,
+                use_container_width=True,
+            )
+            st.caption(f"Rerun total {total_ms:,.1f} ms · log: {os.path.basename(PERF_LOG_PATH)}")
+            if last_download:
+                st.caption(
+                    f"Last download: {last_download['phase']} {last_download['ms']:,.0f} ms, "
+                    f"{last_download['bytes'] / 1e6:,.2f} MB"
+                )
+            st.checkbox("Measure peak memory per phase (slower)", key="perf_trace_memory")
 
-st.download_button(
-    "Download Filtered Results - Excel File",
-    data=output,
-    file_name="latency_results.xlsx",
-    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-)
\ No newline at end of file
+    try:
+        log_phases(
+            perf.phases,
+            event="rerun",
+            total_ms=total_ms,
+            query_mode=query_mode,
+            rows=total_rows,
+            page_size=table['page_size'],
+            columns=len(selected_columns),
+        )
+    except OSError:
+        # Read-only deployment: the panel still works
+        pass
+
+    # ======================================================================================
+    # Profiler output (?profile=1)
+    # ======================================================================================
+    if profiler is not None:
+        profiler.disable()
+        filter_hash = hashlib.sha256(repr((
+            filter_args, selected_columns, query_mode,
+            table['sort_column'], table['descending'], table['page'], table['page_size'],
+        )).encode()).hexdigest()[:10]
+        profile_path = save_profile(profiler, filter_hash)
+        with st.expander(f"🔬 Profile · {os.path.basename(profile_path)}", expanded=True):
+            st.dataframe(pd.DataFrame(top_functions(profiler)), hide_index=True, use_container_width=True)
+            st.caption(f"Saved to {profile_path} · open with `python -m pstats` or snakeviz")
+    elif profile_requested:
+        st.warning("Profiler busy: another session is being profiled right now. Rerun to try again.")
+
+
+try:
+    main()
+finally:
+    # A rerun cut short (reset, st.rerun(scope="app"), an error) never reaches the end of
+    # main(); left running, tracemalloc (and on 3.12+ cProfile) would slow every session
+    # and keep answering later ?profile=1 runs with "Profiler busy"
+    perf.stop()
+    if profiler is not None:
+        profiler.disable()
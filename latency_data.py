@@ -0,0 +1,652 @@
+import os
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+from migrations import TYPED_COLUMNS_VERSION
+
+# --- DB Location --- (LATENCY_DB points the dashboard at another copy, e.g. a synthetic one)
+DB_PATH = os.environ.get('LATENCY_DB', os.path.join(os.path.dirname(__file__), 'latency_results.db'))
+
+DESIRED_ORDER = [
+    'product_name',
+    'frame_size',
+    'result',
+    'uplink_transceiver',
+    'firmware_version',
+    'system_mode',
+    'client_service_type',
+    'client_fec_mode',
+    'uplink_service_type',
+    'uplink_fec_mode',
+    'modulation_format',
+    'datetime',
+    'serial_number',
+    'part_number',
+    'hardware_version',
+    'traffic_generator_application',
+    'id',
+]
+
+# Sidebar filter columns, in cascade order
+DIMENSION_COLUMNS = [
+    'product_name',
+    'hardware_version',
+    'firmware_version',
+    'traffic_generator_application',
+    'system_mode',
+    'client_service_type',
+    'client_fec_mode',
+    'uplink_service_type',
+    'uplink_fec_mode',
+    'modulation_format',
+    'uplink_transceiver',
+    'frame_size',
+]
+
+# Low-cardinality text held as Categoricals (sorted categories + integer codes)
+CATEGORY_COLUMNS = DIMENSION_COLUMNS + ['serial_number', 'part_number']
+
+# No filter uses them and the table hides them until ticked, so the in-memory frame
+# only gets them once some session shows them (IncrementalLoader.refresh(extra_columns))
+LAZY_COLUMNS = ['serial_number', 'part_number']
+
+# DESIRED_ORDER = [
+#     'id',
+#     'product_name',
+#     'datetime',
+#     'serial_number',
+#     'part_number',
+#     'hardware_version',
+#     'firmware_version',
+#     'traffic_generator_application',
+#     'system_mode',
+#     'client_service_type',
+#     'client_fec_mode',
+#     'uplink_service_type',
+#     'uplink_fec_mode',
+#     'modulation_format',
+#     'uplink_transceiver',
+#     'frame_size',
+#     'result',
+# ]
+
+
+def prepare_frame(df: pd.DataFrame, typed: bool = False) -> pd.DataFrame:
+    """
+    Parse raw test_results rows into the frame the dashboard works on.
+    Only touches the rows it is given, so it can be applied to a delta.
+    With typed=True the rows were selected through select_list(typed=True), so
+    result is REAL (or NULL) and datetime is integer epoch microseconds.
+    """
+    # Datetime to the second
+    if 'datetime' in df.columns:
+        if typed:
+            df['datetime'] = pd.to_datetime(df['datetime'], unit='us').dt.floor('s')
+        else:
+            df['datetime'] = pd.to_datetime(df['datetime']).dt.floor('s')
+
+    # Convert result to numeric - typed too: a delta whose result_us are all NULL comes
+    # back as an object column, and appending it would turn the shared frame's result into one
+    if 'result' in df.columns:
+        df['result'] = pd.to_numeric(df['result'], errors='coerce').astype('float64')
+
+    # Drop unused columns
+    df = df.drop(columns=[col for col in ['step'] if col in df.columns])
+    df = df[[c for c in DESIRED_ORDER if c in df.columns]]
+
+    # Compact in-memory representation: ~10 distinct values per text column, so keep
+    # one dictionary per column plus integer codes, and 32-bit ids. result stays float64:
+    # float32 would change the stored latencies (9.9999995 -> 9.999999) and the threshold filters
+    dtypes = {c: 'category' for c in CATEGORY_COLUMNS if c in df.columns}
+    if 'id' in df.columns:
+        dtypes['id'] = 'int32'
+    return df.astype(dtypes)
+
+
+def append_rows(df: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """
+    Append prepared rows to a prepared frame, keeping the categorical columns
+    categorical. Categories stay sorted; old codes are only remapped when the new
+    rows bring values that were never seen before.
+    """
+    for column in CATEGORY_COLUMNS:
+        if column not in df.columns:
+            continue
+        categories = df[column].cat.categories
+        unseen = new[column].cat.categories.difference(categories)
+        if len(unseen):
+            categories = categories.append(unseen).sort_values()
+            df = df.assign(**{column: df[column].cat.set_categories(categories)})
+        new = new.assign(**{column: new[column].cat.set_categories(categories)})
+    return pd.concat([df, new], ignore_index=True)
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def _check_column(column: str) -> str:
+    # Column names are interpolated into SQL, so only known test_results columns pass
+    if column not in DESIRED_ORDER:
+        raise ValueError(f"Unknown test_results column: {column!r}")
+    return column
+
+
+def _present_columns(conn) -> list[str]:
+    present = {row[1] for row in conn.execute(text('PRAGMA table_info(test_results)'))}
+    return [c for c in DESIRED_ORDER if c in present]
+
+
+def typed_columns_ready(conn) -> bool:
+    """
+    True once migrations.py has added and fully backfilled result_us / ts_epoch_us.
+    """
+    has_versions = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'")
+    ).first()
+    if not has_versions:
+        return False
+    return conn.execute(
+        text('SELECT 1 FROM schema_version WHERE version = :v'), {'v': TYPED_COLUMNS_VERSION}
+    ).first() is not None
+
+
+def select_list(columns: list[str], typed: bool = False) -> str:
+    """
+    SELECT expressions for dashboard columns; typed=True reads the numeric columns
+    (result_us, ts_epoch_us) under the names the dashboard uses.
+    """
+    typed_sources = {'result': 'result_us', 'datetime': 'ts_epoch_us'}
+    exprs = []
+    for column in columns:
+        _check_column(column)
+        if typed and column in typed_sources:
+            exprs.append(f"{typed_sources[column]} AS {column}")
+        else:
+            exprs.append(column)
+    return ', '.join(exprs)
+
+
+# ======================================================================================
+# Change signal (checked once per rerun)
+# ======================================================================================
+
+def db_change_signal(db_path: str) -> tuple:
+    """
+    Cheap "did the DB change?" token: mtime + size of the DB file and its WAL/journal.
+    A few stat() calls, no SQLite connection.
+    """
+    signal = []
+    for path in (db_path, db_path + '-wal', db_path + '-journal'):
+        try:
+            st = os.stat(path)
+        except OSError:
+            signal.append(None)
+        else:
+            signal.append((st.st_mtime_ns, st.st_size))
+    return tuple(signal)
+
+
+# ======================================================================================
+# Incremental loader (append-only delta on test_results.id)
+# ======================================================================================
+
+def rewrite_count(conn) -> int | None:
+    """
+    UPDATEs + DELETEs ever applied to test_results, kept by the triggers of migration 007.
+    None on a DB without them, where a rewrite below the id watermark cannot be told apart.
+    """
+    has_counter = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'test_results_changes'")
+    ).first()
+    if not has_counter:
+        return None
+    return conn.execute(text('SELECT rewrites FROM test_results_changes WHERE id = 0')).scalar()
+
+
+class IncrementalLoader:
+    """
+    Keeps the parsed test_results frame (sorted by id) between refreshes and only
+    fetches rows with id > max_id_seen. Falls back to a full reload when rows at or below the watermark
+    were deleted or rewritten (rewrite_count() moved), or when the table schema changed.
+    Without the counter (migrations.py not run) every change is a full reload.
+    The DB is only queried when db_change_signal() moved since the last refresh.
+    Every caller gets the same frame, never to be written to in place (with pandas 3
+    copy-on-write, whatever is derived from it copies on its first write); a reload
+    swaps in a new one instead of changing the old one under a running rerun.
+    LAZY_COLUMNS are left out until first asked for; from then on they are kept, and
+    `columns` still lists every dashboard column the table has.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.db_path = engine.url.database
+        self.df = None
+        self.version = 0
+        self.change_signal = None
+        self.hits = 0
+        self.reloads = 0
+        self.last_reload = None
+        self.max_id = 0
+        self.rewrites = None
+        self.schema_version = None
+        self.typed = None
+        self.columns = None
+        self.lazy_loaded = set()
+        self.full_loads = 0
+        self.delta_loads = 0
+        self._lock = threading.Lock()
+
+    def refresh(self, extra_columns=()) -> tuple[pd.DataFrame, int]:
+        """
+        The current frame and its version, read together under the lock: anything cached
+        per version (bitmap index, sort orders, exports) must be built from that frame.
+        """
+        with self._lock:
+            change_signal = db_change_signal(self.db_path)
+            if self.df is not None and change_signal == self.change_signal:
+                self.hits += 1
+                self._add_lazy_columns(extra_columns)
+                return self.df, self.version
+
+            with self.engine.connect() as conn:
+                schema_version = conn.execute(text('PRAGMA schema_version')).scalar()
+                typed = typed_columns_ready(conn)
+                rewrites = rewrite_count(conn)
+                if self.df is None or (schema_version, typed) != (self.schema_version, self.typed):
+                    self._full_load(conn, schema_version, typed, rewrites)
+                elif rewrites is None or rewrites != self.rewrites:
+                    self._full_load(conn, schema_version, typed, rewrites)
+                else:
+                    self._delta_load(conn)
+            self.change_signal = change_signal
+            self.reloads += 1
+            self.last_reload = time.time()
+            self._add_lazy_columns(extra_columns)
+            return self.df, self.version
+
+    @property
+    def incremental(self) -> bool:
+        """
+        False while every DB change is a full reload (no rewrite counter: migrations.py not run).
+        """
+        return self.rewrites is not None
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.reloads
+        return self.hits / total if total else 0.0
+
+    def _loaded_columns(self) -> list[str]:
+        return [c for c in self.columns if c not in LAZY_COLUMNS or c in self.lazy_loaded]
+
+    def _add_lazy_columns(self, columns) -> None:
+        # Same rows, one more column: positions (bitmap index, sort orders) stay valid,
+        # so the frame version is not bumped
+        missing = [c for c in LAZY_COLUMNS if c in columns and c in self.columns and c not in self.lazy_loaded]
+        if not missing:
+            return
+        with self.engine.connect() as conn:
+            raw = pd.read_sql(
+                text(f"SELECT id, {', '.join(missing)} FROM test_results WHERE id <= :id ORDER BY id"),
+                conn,
+                params={'id': self.max_id},
+            )
+        # Aligned on id: rows deleted since the last refresh just come back empty
+        added = prepare_frame(raw).set_index('id').reindex(self.df['id'].to_numpy())
+        self.lazy_loaded.update(missing)
+        frame = self.df.assign(**{c: added[c].array for c in missing})
+        self.df = frame[[c for c in DESIRED_ORDER if c in frame.columns]]
+
+    def _full_load(self, conn, schema_version, typed: bool, rewrites: int | None) -> None:
+        self.columns = _present_columns(conn)
+        self.typed = typed
+        raw = pd.read_sql(
+            text(f'SELECT {select_list(self._loaded_columns(), typed)} FROM test_results ORDER BY id'), conn
+        )
+        self.max_id = int(raw['id'].max()) if len(raw) else 0
+        self.rewrites = rewrites
+        self.schema_version = schema_version
+        self.df = prepare_frame(raw, typed).reset_index(drop=True)
+        self.version += 1
+        self.full_loads += 1
+
+    def _delta_load(self, conn) -> None:
+        raw = pd.read_sql(
+            text(
+                f'SELECT {select_list(self._loaded_columns(), self.typed)} FROM test_results '
+                f'WHERE id > :id ORDER BY id'
+            ),
+            conn,
+            params={'id': self.max_id},
+        )
+        if raw.empty:
+            return
+
+        self.max_id = int(raw['id'].max())
+
+        # Only the new rows are parsed; the concat itself is a plain memory copy
+        self.df = append_rows(self.df, prepare_frame(raw, self.typed))
+        self.version += 1
+        self.delta_loads += 1
+
+
+# ======================================================================================
+# SQL predicate pushdown
+# ======================================================================================
+
+def table_columns(engine) -> list[str]:
+    """
+    Dashboard columns present in test_results, in DESIRED_ORDER.
+    """
+    with engine.connect() as conn:
+        return _present_columns(conn)
+
+
+def build_where(
+    selections: dict,
+    id_ranges: list | None = None,
+    id_excludes: list | None = None,
+    latency_filter_type: str = "Show All",
+    latency_threshold: float = 0.0,
+    typed: bool = False,
+    params: dict | None = None,
+) -> tuple[str, dict]:
+    """
+    Compile the sidebar state into one parameterized WHERE clause.
+    selections maps column -> selected values (empty = no filter),
+    id_ranges / id_excludes are inclusive (start, end) pairs, None for an open end
+    (see latency_filters.parse_id_ranges).
+    Pass `params` to keep numbering placeholders when combining several clauses.
+    """
+    latency_expr = 'result_us' if typed else 'CAST(result AS REAL)'
+    clauses = []
+    params = {} if params is None else params
+
+    def bind(value) -> str:
+        name = f"p{len(params)}"
+        params[name] = value
+        return f":{name}"
+
+    for column, values in selections.items():
+        if values:
+            placeholders = ", ".join(bind(v) for v in values)
+            clauses.append(f"{_check_column(column)} IN ({placeholders})")
+
+    def interval(lo, hi) -> str:
+        if lo is None:
+            return f"id <= {bind(int(hi))}"
+        if hi is None:
+            return f"id >= {bind(int(lo))}"
+        if lo == hi:
+            return f"id = {bind(int(lo))}"
+        return f"id BETWEEN {bind(int(lo))} AND {bind(int(hi))}"
+
+    if id_ranges:
+        clauses.append("(" + " OR ".join(interval(lo, hi) for lo, hi in id_ranges) + ")")
+    if id_excludes:
+        clauses.append("NOT (" + " OR ".join(interval(lo, hi) for lo, hi in id_excludes) + ")")
+
+    if latency_filter_type == "Above":
+        clauses.append(f"{latency_expr} > {bind(float(latency_threshold))}")
+    elif latency_filter_type == "Below":
+        clauses.append(f"{latency_expr} < {bind(float(latency_threshold))}")
+
+    where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    return where, params
+
+
+def facet_counts(
+    engine,
+    selections: dict,
+    id_ranges: list | None = None,
+    id_excludes: list | None = None,
+    latency_filter_type: str = "Show All",
+    latency_threshold: float = 0.0,
+) -> dict:
+    """
+    SQL version of BitmapIndex.facets(): {column: {value: count}} where each column is
+    counted under every other active filter. One UNION ALL statement, one round trip.
+    """
+    with engine.connect() as conn:
+        typed = typed_columns_ready(conn)
+        params = {}
+        parts = []
+        for column in DIMENSION_COLUMNS:
+            others = {c: v for c, v in selections.items() if c != column}
+            where, params = build_where(
+                others, id_ranges, id_excludes, latency_filter_type, latency_threshold, typed, params
+            )
+            null_check = f"{'AND' if where else 'WHERE'} {column} IS NOT NULL"
+            parts.append(
+                f"SELECT '{column}' AS facet, {column} AS value, COUNT(*) AS n "
+                f"FROM test_results{where} {null_check} GROUP BY {column}"
+            )
+        rows = conn.execute(text(" UNION ALL ".join(parts) + " ORDER BY facet, value"), params)
+
+        counts = {column: {} for column in DIMENSION_COLUMNS}
+        for facet, value, n in rows:
+            counts[facet][value] = n
+    return counts
+
+
+def query_filtered(
+    engine,
+    columns: list[str],
+    selections: dict,
+    id_ranges: list | None = None,
+    id_excludes: list | None = None,
+    latency_filter_type: str = "Show All",
+    latency_threshold: float = 0.0,
+) -> pd.DataFrame:
+    """
+    Run the filters inside SQLite and fetch only `columns` of the matching rows,
+    so memory follows the size of the result instead of the size of the table.
+    """
+    columns = [c for c in DESIRED_ORDER if c in columns or c == 'id']
+    with engine.connect() as conn:
+        typed = typed_columns_ready(conn)
+        where, params = build_where(
+            selections, id_ranges, id_excludes, latency_filter_type, latency_threshold, typed
+        )
+        sql = f"SELECT {select_list(columns, typed)} FROM test_results{where} ORDER BY id"
+        raw = pd.read_sql(text(sql), conn, params=params)
+    return prepare_frame(raw, typed)
+
+
+# ======================================================================================
+# Paged results: keyset pagination on (sort column, id)
+# ======================================================================================
+
+def _sort_expr(column: str, typed: bool = False) -> str:
+    # Same order as latency_filters.sort_order(): missing values first, datetime to
+    # the second, numbers as numbers. COALESCE keeps the row-value comparisons NULL-free.
+    if column == 'id':
+        return 'id'
+    if column == 'result':
+        return f"COALESCE({'result_us' if typed else 'CAST(result AS REAL)'}, -1e308)"
+    if column == 'datetime':
+        return "COALESCE(ts_epoch_us / 1000000, -1e308)" if typed else "COALESCE(substr(datetime, 1, 19), '')"
+    return f"COALESCE({_check_column(column)}, '')"
+
+
+def count_filtered(
+    engine,
+    selections: dict,
+    id_ranges: list | None = None,
+    id_excludes: list | None = None,
+    latency_filter_type: str = "Show All",
+    latency_threshold: float = 0.0,
+) -> int:
+    with engine.connect() as conn:
+        typed = typed_columns_ready(conn)
+        where, params = build_where(
+            selections, id_ranges, id_excludes, latency_filter_type, latency_threshold, typed
+        )
+        return conn.execute(text(f"SELECT COUNT(*) FROM test_results{where}"), params).scalar()
+
+
+def page_cursor(
+    engine,
+    offset: int,
+    sort_column: str,
+    descending: bool,
+    selections: dict,
+    id_ranges: list | None = None,
+    id_excludes: list | None = None,
+    latency_filter_type: str = "Show All",
+    latency_threshold: float = 0.0,
+) -> tuple | None:
+    """
+    Keyset cursor (sort key, id) of the row just before `offset`, for jumping to a page
+    that was not reached by paging. Only the key columns are read while skipping.
+    """
+    if offset <= 0:
+        return None
+    with engine.connect() as conn:
+        typed = typed_columns_ready(conn)
+        where, params = build_where(
+            selections, id_ranges, id_excludes, latency_filter_type, latency_threshold, typed
+        )
+        direction = 'DESC' if descending else 'ASC'
+        expr = _sort_expr(sort_column, typed)
+        params['offset'] = offset - 1
+        row = conn.execute(
+            text(f"SELECT {expr}, id FROM test_results{where} "
+                 f"ORDER BY {expr} {direction}, id {direction} LIMIT 1 OFFSET :offset"),
+            params,
+        ).first()
+    return tuple(row) if row is not None else None
+
+
+def query_page(
+    engine,
+    columns: list[str],
+    selections: dict,
+    id_ranges: list | None = None,
+    id_excludes: list | None = None,
+    latency_filter_type: str = "Show All",
+    latency_threshold: float = 0.0,
+    sort_column: str = 'id',
+    descending: bool = False,
+    page_size: int = 100,
+    after: tuple | None = None,
+) -> tuple[pd.DataFrame, tuple | None]:
+    """
+    One page of the filtered rows, ordered by (sort_column, id), starting after the
+    keyset cursor `after` (None = first page). Returns (frame, cursor of its last row).
+    Cost follows page_size, not how deep the page is.
+    """
+    columns = [c for c in DESIRED_ORDER if c in columns or c == 'id']
+    with engine.connect() as conn:
+        typed = typed_columns_ready(conn)
+        where, params = build_where(
+            selections, id_ranges, id_excludes, latency_filter_type, latency_threshold, typed
+        )
+        direction = 'DESC' if descending else 'ASC'
+        expr = _sort_expr(sort_column, typed)
+        if after is not None:
+            params['after_key'], params['after_id'] = after
+            comparison = '<' if descending else '>'
+            where += f" {'AND' if where else 'WHERE'} ({expr}, id) {comparison} (:after_key, :after_id)"
+        params['page_size'] = int(page_size)
+        sql = (
+            f"SELECT {select_list(columns, typed)}, {expr} AS sort_key FROM test_results{where} "
+            f"ORDER BY {expr} {direction}, id {direction} LIMIT :page_size"
+        )
+        raw = pd.read_sql(text(sql), conn, params=params)
+
+    last = (raw['sort_key'].tolist()[-1], raw['id'].tolist()[-1]) if len(raw) else None
+    return prepare_frame(raw.drop(columns='sort_key'), typed), last
+
+
+# ======================================================================================
+# URL state: value dictionary and saved views (see latency_url.py)
+# ======================================================================================
+
+class ValueDictionary:
+    """
+    Every value each filter column has had, in order of first appearance (by id).
+    New rows can only append to it, so a position keeps naming the same value and URL
+    bitsets made against an older version stay valid. Like IncrementalLoader it only
+    reads rows above its id watermark, and only when db_change_signal() moved; when rows
+    below it were rewritten or deleted (rewrite_count() moved, or MAX(id) went down and
+    SQLite will hand those ids out again) it rescans the whole table - still appending.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.db_path = engine.url.database
+        self.values = {column: [] for column in DIMENSION_COLUMNS}
+        self.max_id = 0
+        self.rewrites = None
+        self.change_signal = None
+        self._lock = threading.Lock()
+
+    def refresh(self) -> dict:
+        with self._lock:
+            change_signal = db_change_signal(self.db_path)
+            if change_signal == self.change_signal:
+                return self.values
+
+            with self.engine.connect() as conn:
+                present = set(_present_columns(conn))
+                columns = [c for c in DIMENSION_COLUMNS if c in present]
+                max_id = conn.execute(text('SELECT MAX(id) FROM test_results')).scalar() or 0
+                rewrites = rewrite_count(conn)
+                rescan = not self.max_id or rewrites is None or rewrites != self.rewrites or max_id < self.max_id
+                if columns and (max_id > self.max_id or rescan):
+                    # A rescan has no id range, so SQLite can scan the filter indexes instead of the
+                    # table (rows landing mid-scan are read again by the next delta, and deduplicated)
+                    id_range = "" if rescan else "id > :lo AND id <= :hi AND "
+                    parts = [
+                        f"SELECT '{c}' AS facet, {c} AS value, MIN(id) AS first_id FROM test_results "
+                        f"WHERE {id_range}{c} IS NOT NULL GROUP BY {c}"
+                        for c in columns
+                    ]
+                    rows = conn.execute(
+                        text(" UNION ALL ".join(parts) + " ORDER BY first_id"), {'lo': self.max_id, 'hi': max_id}
+                    )
+                    # Readers keep the lists they were handed; extend copies
+                    values = {column: list(known) for column, known in self.values.items()}
+                    seen = {column: set(known) for column, known in values.items()}
+                    for facet, value, _ in rows:
+                        value = str(value)
+                        if value not in seen[facet]:
+                            seen[facet].add(value)
+                            values[facet].append(value)
+                    self.values = values
+                self.max_id = max_id
+                self.rewrites = rewrites
+            self.change_signal = change_signal
+            return self.values
+
+
+def _has_saved_views(conn) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'saved_views'")
+    ).first() is not None
+
+
+def save_view(engine, view_hash: str, state_json: str) -> None:
+    """
+    Store a dashboard URL state for a ?v= short link. Raises RuntimeError until
+    migrations.py has created saved_views.
+    """
+    with engine.begin() as conn:
+        if not _has_saved_views(conn):
+            raise RuntimeError("saved_views table missing: run migrations.py")
+        conn.execute(
+            text("INSERT OR IGNORE INTO saved_views (hash, state, created_at) VALUES (:h, :s, :t)"),
+            {'h': view_hash, 's': state_json, 't': time.strftime('%Y-%m-%dT%H:%M:%S')},
+        )
+
+
+def load_view(engine, view_hash: str) -> str | None:
+    with engine.connect() as conn:
+        if not _has_saved_views(conn):
+            return None
+        return conn.execute(text("SELECT state FROM saved_views WHERE hash = :h"), {'h': view_hash}).scalar()
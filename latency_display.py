@@ -0,0 +1,74 @@
+import numpy as np
+
+
+# --- Renamed display columns ---
+display_columns_map = {
+    'id': 'ID',
+    'product_name': 'Product Name',
+    'datetime': 'Date & Time',
+    'serial_number': 'Serial Number',
+    'part_number': 'Part Number',
+    'hardware_version': 'Hardware Version',
+    'firmware_version': 'Firmware Version',
+    'traffic_generator_application': 'Traffic Generator Application',
+    'system_mode': 'System Mode',
+    'client_service_type': 'Client Service Type',
+    'client_fec_mode': 'Client FEC Mode',
+    'uplink_service_type': 'Uplink Service Type',
+    'uplink_fec_mode': 'Uplink FEC Mode',
+    'modulation_format': 'Modulation Format',
+    'uplink_transceiver': 'Uplink Transceiver',
+    'frame_size': 'Frame Size',
+    'result': 'Latency (uSecs)'
+}
+
+# Sidebar filters: (query param, session_state key, DB column, label) in cascade order
+FILTER_KEYS = [
+    ("product", "sel_product", "product_name", "Product Name"),
+    ("hw", "sel_hw", "hardware_version", "Hardware Version"),
+    ("fw", "sel_fw", "firmware_version", "Firmware Version"),
+    ("tg", "sel_tg", "traffic_generator_application", "Traffic Generator Application"),
+    ("mode", "sel_mode", "system_mode", "System Mode"),
+    ("client", "sel_client", "client_service_type", "Client Service Type"),
+    ("client_fec", "sel_client_fec", "client_fec_mode", "Client FEC Mode"),
+    ("uplink", "sel_uplink", "uplink_service_type", "Uplink Service Type"),
+    ("uplink_fec", "sel_uplink_fec", "uplink_fec_mode", "Uplink FEC Mode"),
+    ("mod", "sel_mod", "modulation_format", "Modulation Format"),
+    ("uplink_tr", "sel_uplink_tr", "uplink_transceiver", "Uplink Transceiver"),
+    ("frame", "sel_frame", "frame_size", "Frame Size"),
+]
+
+LATENCY_COLUMN = 'Latency (uSecs)'
+LATENCY_CSS = 'background-color: #C6EFCE'
+LATENCY_ABOVE_CSS = 'background-color: #FFC7CE'
+
+
+def highlight_latency_column(df, threshold=None):
+    """
+    Green latency column, red where it is above `threshold` (None = no threshold).
+    The CSS for the whole column comes from one np.where, and only the page on
+    screen is styled, so the cost does not grow with the number of matching rows.
+    """
+    if LATENCY_COLUMN not in df.columns:
+        return df
+
+    def latency_css(column):
+        if threshold is None:
+            return np.full(len(column), LATENCY_CSS, dtype=object)
+        return np.where(column.to_numpy() > threshold, LATENCY_ABOVE_CSS, LATENCY_CSS)
+
+    return df.style.apply(latency_css, subset=[LATENCY_COLUMN])
+
+# Closes an open multiselect dropdown as soon as an option is picked, on the client, so
+# a filter edit reaches the server as one ordinary value change (no widget remount)
+CLOSE_ON_SELECT_JS = """
+export default function () {
+    if (window.__latencyCloseOnSelect) return;
+    window.__latencyCloseOnSelect = true;
+    document.addEventListener("click", (event) => {
+        if (!event.target.closest('[data-testid="stMultiSelectDropdown"] [role="option"]')) return;
+        // Once the widget has taken the click: the combobox closes its list on blur
+        setTimeout(() => document.activeElement && document.activeElement.blur(), 0);
+    }, true);
+}
+"""
@@ -0,0 +1,219 @@
+import gzip
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+LOGO_PATH = os.path.join(os.path.dirname(__file__), "Packetlight Logo.png")
+
+SHEET_NAME = "Latency Results"
+HEADER_ROW = 5
+
+# Rows encoded per chunk by the streaming exporters
+EXPORT_CHUNK_ROWS = 50_000
+
+# Rows converted to Python values at a time by the Excel writer
+EXCEL_CHUNK_ROWS = 5_000
+
+
+def _export_ready(export_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turn the display frame's compact dtypes into what the export files should show.
+    """
+    if 'Date & Time' in export_df.columns:
+        # datetime64 in the frame; exports get the same text the table shows
+        export_df = export_df.assign(**{'Date & Time': export_df['Date & Time'].dt.strftime('%Y-%m-%d %H:%M:%S')})
+    return export_df
+
+
+def _row_chunks(export_df: pd.DataFrame, chunk_rows: int):
+    for start in range(0, len(export_df), chunk_rows):
+        yield _export_ready(export_df.iloc[start:start + chunk_rows])
+
+
+def _column_values(series: pd.Series) -> list:
+    """
+    One column as plain Python values ('' for missing), converted in a single
+    vectorized pass instead of boxing every cell through .iloc.
+    """
+    values = series.to_numpy(dtype=object)
+    values[pd.isna(values)] = ""
+    return values.tolist()
+
+
+def _column_width(series: pd.Series, header: str) -> int:
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Only the categories that occur, measured once each
+        codes = series.cat.codes.to_numpy()
+        used = series.cat.categories[np.unique(codes[codes >= 0])]
+        lengths = used.astype(str).str.len()
+    else:
+        lengths = series.dropna().astype(str).str.len()
+    longest = int(lengths.max()) if len(lengths) else 0
+    return max(longest, len(str(header))) + 2
+
+
+def excel_bytes(export_df: pd.DataFrame, logo_path: str = LOGO_PATH) -> bytes:
+    """
+    Build the "Latency Results" workbook (logo, title, formatted table) for export_df.
+
+    Uses xlsxwriter's constant_memory mode: every row is streamed to a temp file as
+    soon as it is written, so memory stays flat however many rows are exported.
+    Rows therefore have to be written strictly top to bottom, and are converted to
+    Python values EXCEL_CHUNK_ROWS at a time.
+    """
+    output = io.BytesIO()
+
+    # Cells are data: no sniffing every string for URLs or formulas
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'strings_to_urls': False,
+        'strings_to_formulas': False,
+    })
+    worksheet = workbook.add_worksheet(SHEET_NAME)
+
+    worksheet.insert_image('A1', logo_path, {'x_scale': 0.5, 'y_scale': 0.5})
+
+    title_format = workbook.add_format({
+        'bold': True,
+        'font_size': 16,
+        'align': 'left',
+        'valign': 'vcenter'
+    })
+    worksheet.write('A4', 'PacketLight Latency Test Results', title_format)
+
+    header_format = workbook.add_format({
+        'bold': True,
+        'align': 'center',
+        'valign': 'vcenter',
+        'bg_color': '#D9E1F2',
+        'border': 1
+    })
+    worksheet.write_row(HEADER_ROW, 0, [str(c) for c in export_df.columns], header_format)
+
+    cell_format = workbook.add_format({
+        'align': 'center',
+        'valign': 'vcenter',
+        'border': 1
+    })
+    row = HEADER_ROW + 1
+    for chunk in _row_chunks(export_df, EXCEL_CHUNK_ROWS):
+        columns = [_column_values(chunk[col]) for col in chunk.columns]
+        for values in zip(*columns):
+            worksheet.write_row(row, 0, values, cell_format)
+            row += 1
+
+    for i, col in enumerate(export_df.columns):
+        worksheet.set_column(i, i, _column_width(export_df[col], col))
+
+    worksheet.freeze_panes(HEADER_ROW + 1, 0)
+    workbook.close()
+
+    return output.getvalue()
+
+
+# ======================================================================================
+# Streaming exporters: CSV, gzip CSV, Parquet, JSON Lines
+# ======================================================================================
+
+def iter_csv(export_df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """
+    CSV as a stream of byte chunks (header first), encoded chunk_rows rows at a time.
+    """
+    yield export_df.iloc[:0].to_csv(index=False).encode()
+    for chunk in _row_chunks(export_df, chunk_rows):
+        yield chunk.to_csv(header=False, index=False).encode()
+
+
+def iter_csv_gzip(export_df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """
+    iter_csv() pushed through one gzip stream; each chunk is compressed as it arrives.
+    """
+    sink = io.BytesIO()
+    with gzip.GzipFile(fileobj=sink, mode='wb') as gz:
+        for block in iter_csv(export_df, chunk_rows):
+            gz.write(block)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only file for ParquetWriter: collects bytes until drained, but keeps
+    # counting the total so tell() (used for the footer offsets) stays correct
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def iter_parquet(export_df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """
+    Parquet with one row group per chunk; every row group is yielded once written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    for chunk in _row_chunks(export_df, chunk_rows):
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is None:
+        # No rows: still a valid file with the column names
+        writer = pq.ParquetWriter(sink, pa.Table.from_pandas(_export_ready(export_df), preserve_index=False).schema)
+    writer.close()
+    yield sink.drain()
+
+
+def iter_jsonl(export_df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """
+    One JSON object per line, keyed by the display column names.
+    """
+    for chunk in _row_chunks(export_df, chunk_rows):
+        yield chunk.to_json(orient='records', lines=True, force_ascii=False).encode()
+
+
+# label -> (chunk generator, file extension, MIME type)
+STREAM_FORMATS = {
+    "CSV": (iter_csv, "csv", "text/csv"),
+    "CSV (gzip)": (iter_csv_gzip, "csv.gz", "application/gzip"),
+    "Parquet": (iter_parquet, "parquet", "application/vnd.apache.parquet"),
+    "JSON Lines": (iter_jsonl, "jsonl", "application/x-ndjson"),
+}
+
+
+def stream_bytes(export_format: str, export_df: pd.DataFrame) -> bytes:
+    """
+    Run one of the STREAM_FORMATS generators to the end, appending each chunk to one
+    buffer as it arrives (no list of chunks plus a joined copy). The generator is the
+    last holder of export_df, so the frame is freed before the bytes are returned.
+    """
+    chunks, _, _ = STREAM_FORMATS[export_format]
+    blocks = chunks(export_df)
+    del export_df
+    output = io.BytesIO()
+    # writelines() lets go of each chunk once written, before the next is encoded
+    output.writelines(blocks)
+    return output.getvalue()
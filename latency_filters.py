@@ -0,0 +1,217 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from latency_data import DIMENSION_COLUMNS
+
+
+# ======================================================================================
+# Bitmap index over the categorical filter columns
+# ======================================================================================
+
+_BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _popcount_rows(words: np.ndarray) -> np.ndarray:
+    """
+    Number of set bits in each row of a 2-D uint64 array.
+    """
+    if hasattr(np, 'bitwise_count'):  # numpy >= 2.0
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+    as_bytes = words.view(np.uint8).reshape(words.shape[0], -1)
+    return _BYTE_POPCOUNT[as_bytes].sum(axis=1, dtype=np.int64)
+
+
+class BitmapIndex:
+    """
+    One packed bitmap per (column, value), built once per loaded frame.
+    A selection is answered by OR-ing the bitmaps of the picked values within a
+    column and AND-ing across columns; row masks are uint64 words, 64 rows each.
+    """
+
+    def __init__(self, df: pd.DataFrame, columns: list[str] = DIMENSION_COLUMNS):
+        self.n_rows = len(df)
+        self.n_words = (self.n_rows + 63) // 64
+        self.columns = [c for c in columns if c in df.columns]
+        self.categories = {}
+        self.bitmaps = {}
+
+        for column in self.columns:
+            categories = df[column].cat.categories
+            codes = df[column].cat.codes.to_numpy()
+            bitmaps = np.zeros((len(categories), self.n_words), dtype=np.uint64)
+            for code in range(len(categories)):
+                bitmaps[code] = self.pack(codes == code)
+            # Shared by every session: read-only, masks are always new arrays
+            bitmaps.flags.writeable = False
+            self.categories[column] = categories
+            self.bitmaps[column] = bitmaps
+
+        self.all_rows = self.pack(np.ones(self.n_rows, dtype=bool))
+        self.all_rows.flags.writeable = False
+
+    @property
+    def nbytes(self) -> int:
+        return sum(b.nbytes for b in self.bitmaps.values()) + self.all_rows.nbytes
+
+    def pack(self, flags: np.ndarray) -> np.ndarray:
+        """
+        Row mask from a boolean array with one entry per row.
+        """
+        packed = np.zeros(self.n_words * 8, dtype=np.uint8)
+        packed[:(self.n_rows + 7) // 8] = np.packbits(flags, bitorder='little')
+        return packed.view(np.uint64)
+
+    def column_mask(self, column: str, values: list) -> np.ndarray:
+        """
+        Rows whose `column` is any of `values` (all rows when nothing is selected).
+        """
+        if not values:
+            return self.all_rows
+        codes = self.categories[column].get_indexer(values)
+        codes = codes[codes >= 0]
+        if len(codes) == 0:
+            return np.zeros(self.n_words, dtype=np.uint64)
+        return np.bitwise_or.reduce(self.bitmaps[column][codes], axis=0)
+
+    def facets(self, selections: dict, base: np.ndarray | None = None) -> tuple[dict, np.ndarray]:
+        """
+        Per-option row counts for every column, each computed under all the *other*
+        active selections (and `base`, e.g. the ID / latency filters).
+        Returns ({column: {value: count}} with zero counts left out, final row mask).
+
+        Leave-one-out masks come from running prefix / suffix ANDs, so this is one pass
+        over the columns plus one popcount per column, not a re-filter per column.
+        """
+        base = self.all_rows if base is None else base
+        masks = [self.column_mask(c, selections.get(c)) for c in self.columns]
+
+        prefix = [base]
+        for mask in masks[:-1]:
+            prefix.append(prefix[-1] & mask)
+        suffix = [self.all_rows] * len(masks)
+        for i in range(len(masks) - 2, -1, -1):
+            suffix[i] = suffix[i + 1] & masks[i + 1]
+
+        counts = {}
+        for i, column in enumerate(self.columns):
+            per_value = _popcount_rows(self.bitmaps[column] & (prefix[i] & suffix[i]))
+            present = np.flatnonzero(per_value)
+            counts[column] = dict(zip(self.categories[column][present].tolist(), per_value[present].tolist()))
+
+        final = prefix[-1] & masks[-1] if masks else base
+        return counts, final
+
+    def flags(self, mask: np.ndarray) -> np.ndarray:
+        """
+        Boolean array with one entry per row, the inverse of pack().
+        """
+        return np.unpackbits(mask.view(np.uint8), count=self.n_rows, bitorder='little').view(bool)
+
+    def rows(self, mask: np.ndarray) -> np.ndarray:
+        """
+        Positional row indices set in `mask`.
+        """
+        return np.flatnonzero(self.flags(mask))
+
+
+# ======================================================================================
+# Sorted paging over the loaded frame
+# ======================================================================================
+
+def sort_order(df: pd.DataFrame, column: str) -> np.ndarray:
+    """
+    Row positions of `df` ordered by `column`, missing values first. The frame is kept
+    sorted by id, so a stable sort leaves ties in id order - the same (column, id)
+    order the SQL pages use. Computed once per frame and column, then every filter
+    state just keeps the positions it matches (see ordered_rows).
+    """
+    series = df[column]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        keys = series.cat.codes.to_numpy()  # categories are sorted; missing is -1
+    elif pd.api.types.is_datetime64_any_dtype(series.dtype):
+        keys = series.to_numpy().view(np.int64)  # NaT is the smallest int64
+    else:
+        keys = series.to_numpy(dtype=np.float64, na_value=-np.inf)
+    return np.argsort(keys, kind='stable')
+
+
+def ordered_rows(order: np.ndarray, flags: np.ndarray, descending: bool = False) -> np.ndarray:
+    """
+    Matching row positions (flags) in sort_order() order; reversed for descending,
+    which also reverses the id tie-break like ORDER BY ... DESC, id DESC.
+    """
+    ordered = order[flags[order]]
+    return ordered[::-1] if descending else ordered
+
+
+# ======================================================================================
+# ID filter: merged intervals instead of expanded lists
+# ======================================================================================
+
+def _merge_intervals(intervals: list) -> list:
+    # None marks an open end; touching intervals (…-5, 6-…) are merged too
+    merged = []
+    for lo, hi in sorted(intervals, key=lambda iv: -math.inf if iv[0] is None else iv[0]):
+        if merged:
+            prev_lo, prev_hi = merged[-1]
+            if prev_hi is None or lo is None or lo <= prev_hi + 1:
+                merged[-1] = (prev_lo, None if prev_hi is None or hi is None else max(prev_hi, hi))
+                continue
+        merged.append((lo, hi))
+    return merged
+
+
+def parse_id_ranges(id_input: str) -> tuple[list, list]:
+    """
+    Parse the "Filter by ID" box into sorted, merged (lo, hi) intervals:
+    "1, 3, 5-10" (reversed ranges are fine), "2000-" / "-50" (open ended) and
+    "!10-20" / "!7" (exclusions). Returns (include, exclude); an open end is None.
+    Raises ValueError on anything else.
+    """
+    include = []
+    exclude = []
+    for part in id_input.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        target = include
+        if part.startswith("!"):
+            target = exclude
+            part = part[1:].strip()
+
+        if "-" in part:
+            start_str, end_str = (p.strip() for p in part.split("-", 1))
+            if not start_str and not end_str:
+                raise ValueError(f"Empty range: {part!r}")
+            start = int(start_str) if start_str else None
+            end = int(end_str) if end_str else None
+            if start is not None and end is not None and start > end:
+                start, end = end, start
+            target.append((start, end))
+        else:
+            value = int(part)
+            target.append((value, value))
+
+    return _merge_intervals(include), _merge_intervals(exclude)
+
+
+def id_interval_flags(sorted_ids: np.ndarray, include: list, exclude: list) -> np.ndarray:
+    """
+    Boolean row flags for an ascending id array: two searchsorted calls per interval,
+    so the cost follows the number of ranges, not how wide they are.
+    """
+    def positions(lo, hi):
+        start = 0 if lo is None else np.searchsorted(sorted_ids, lo, side='left')
+        stop = len(sorted_ids) if hi is None else np.searchsorted(sorted_ids, hi, side='right')
+        return start, stop
+
+    flags = np.zeros(len(sorted_ids), dtype=bool) if include else np.ones(len(sorted_ids), dtype=bool)
+    for lo, hi in include:
+        start, stop = positions(lo, hi)
+        flags[start:stop] = True
+    for lo, hi in exclude:
+        start, stop = positions(lo, hi)
+        flags[start:stop] = False
+    return flags
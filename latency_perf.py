@@ -0,0 +1,161 @@
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource  # not on Windows
+except ImportError:
+    resource = None
+
+PERF_LOG_PATH = os.environ.get(
+    'LATENCY_PERF_LOG', os.path.join(os.path.dirname(__file__), 'perf_log.jsonl')
+)
+
+# ?profile=1 output: one .prof file per profiled rerun (pstats / snakeviz format)
+PROFILE_DIR = os.environ.get(
+    'LATENCY_PROFILE_DIR', os.path.join(os.path.dirname(__file__), 'profiles')
+)
+PROFILE_TOP_N = 25
+
+_log_lock = threading.Lock()
+
+
+def peak_rss_bytes() -> int | None:
+    """
+    High-water mark of the server process's resident memory (None where unsupported).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def current_rss_bytes() -> int | None:
+    """
+    Resident memory of the server process right now (Linux only; None elsewhere).
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class PhaseTimer:
+    """
+    Wall-clock time (and optionally peak Python allocations) per named phase of one rerun.
+
+        perf = PhaseTimer()
+        with perf.phase("filter"):
+            ...
+
+    Peak memory per phase comes from tracemalloc, which slows everything it watches
+    down several times over, so it is only switched on with trace_memory=True.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.started = time.perf_counter()
+        self.phases = []
+        # tracemalloc is process-wide: only the timer that started it stops it
+        self._owns_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self._owns_tracing:
+            tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name: str):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - base if self.trace_memory else None
+            self.record(name, seconds, peak)
+
+    def record(self, name: str, seconds: float, peak_bytes: int | None = None) -> None:
+        # A phase timed in several places adds up to one entry
+        for entry in self.phases:
+            if entry['phase'] == name:
+                entry['ms'] = round(entry['ms'] + seconds * 1000, 3)
+                if peak_bytes is not None:
+                    entry['peak_bytes'] = max(entry['peak_bytes'] or 0, peak_bytes)
+                return
+        self.phases.append({'phase': name, 'ms': round(seconds * 1000, 3), 'peak_bytes': peak_bytes})
+
+    @property
+    def total_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 3)
+
+    def stop(self) -> None:
+        # Safe to call again (e.g. from a finally after the normal stop)
+        if self._owns_tracing:
+            tracemalloc.stop()
+            self._owns_tracing = False
+
+
+def log_phases(phases: list[dict], path: str = PERF_LOG_PATH, **context) -> None:
+    """
+    Append one JSON line for a rerun (or a download): timestamp, context, phases, peak RSS.
+    """
+    entry = {
+        'ts': datetime.now().isoformat(timespec='milliseconds'),
+        **context,
+        'phases': phases,
+        'peak_rss_bytes': peak_rss_bytes(),
+    }
+    line = json.dumps(entry, default=str)
+    with _log_lock:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+# ======================================================================================
+# Opt-in profiler (?profile=1)
+# ======================================================================================
+
+def start_profiler() -> cProfile.Profile | None:
+    """
+    Deterministic profiler for the current thread, or None when another session's
+    profiler is already running (Python allows one active profiler at a time).
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+
+def save_profile(profiler: cProfile.Profile, filter_hash: str, directory: str = PROFILE_DIR) -> str:
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')[:-3]
+    path = os.path.join(directory, f"{stamp}_{filter_hash}.prof")
+    profiler.dump_stats(path)
+    return path
+
+
+def top_functions(profiler: cProfile.Profile, n: int = PROFILE_TOP_N) -> list[dict]:
+    """
+    The n functions with the most time spent in their own code.
+    """
+    rows = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in pstats.Stats(profiler).stats.items():
+        rows.append({
+            'function': f"{name} ({os.path.basename(filename)}:{line})",
+            'calls': calls,
+            'own_ms': round(own * 1000, 2),
+            'cumulative_ms': round(cumulative * 1000, 2),
+        })
+    rows.sort(key=lambda r: r['own_ms'], reverse=True)
+    return rows[:n]
@@ -0,0 +1,169 @@
+import base64
+import hashlib
+import json
+import zlib
+
+from latency_display import FILTER_KEYS
+
+# First byte of every token; bump when the layout below changes (old layouts must keep decoding)
+STATE_FORMAT = 1
+FLAG_DEFLATE = 0x80
+
+# Option lists, sent as bitsets of positions in the value dictionary
+LIST_KEYS = [qp_key for qp_key, _, _, _ in FILTER_KEYS] + ['cols']
+# Free text, sent as is
+TEXT_KEYS = ['ids', 'lat_type', 'lat_th', 'query']
+
+FINGERPRINT_BYTES = 4
+
+
+# ======================================================================================
+# Byte helpers
+# ======================================================================================
+
+def _put_varint(out: bytearray, n: int) -> None:
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _get_varint(data: bytes, pos: int) -> tuple[int, int]:
+    n = shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("truncated state token")
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return n, pos
+        shift += 7
+
+
+def _fingerprint(dictionary: dict, lengths: dict) -> bytes:
+    # Covers only the dictionary prefixes the bitsets point into
+    used = [[key, [str(v) for v in dictionary.get(key, [])[:n]]] for key, n in lengths.items() if n]
+    return hashlib.sha256(json.dumps(used).encode()).digest()[:FINGERPRINT_BYTES]
+
+
+# ======================================================================================
+# Encode / decode
+# ======================================================================================
+
+def encode_state(state: dict, dictionary: dict) -> str:
+    """
+    URL-safe token for state ({list key: [values], text key: str}) against dictionary
+    ({list key: [values in a fixed order]}). Values missing from the dictionary are dropped.
+    """
+    body = bytearray()
+    for key in TEXT_KEYS:
+        text = str(state.get(key, "")).encode()
+        _put_varint(body, len(text))
+        body += text
+
+    lengths = {}
+    bitsets = []
+    for key in LIST_KEYS:
+        positions = {str(v): i for i, v in enumerate(dictionary.get(key, []))}
+        indexes = [positions[str(v)] for v in state.get(key, []) if str(v) in positions]
+        n_bits = max(indexes) + 1 if indexes else 0
+        bits = bytearray((n_bits + 7) // 8)
+        for i in indexes:
+            bits[i >> 3] |= 1 << (i & 7)
+        lengths[key] = n_bits
+        bitsets.append((n_bits, bits))
+
+    body += _fingerprint(dictionary, lengths)
+    for n_bits, bits in bitsets:
+        _put_varint(body, n_bits)
+        body += bits
+
+    header = STATE_FORMAT
+    packed = bytes(body)
+    deflater = zlib.compressobj(9, zlib.DEFLATED, -15)
+    compressed = deflater.compress(packed) + deflater.flush()
+    if len(compressed) < len(packed):
+        header |= FLAG_DEFLATE
+        packed = compressed
+    return base64.urlsafe_b64encode(bytes([header]) + packed).decode().rstrip("=")
+
+
+def decode_state(token: str) -> tuple[dict, dict, bytes]:
+    """
+    Split a token into (text fields, {list key: (bits, positions)}, fingerprint).
+    No dictionary needed yet, so the text fields (e.g. the query mode) can be applied first.
+    Raises ValueError for anything that is not a token of a known format.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (ValueError, TypeError) as e:
+        raise ValueError("state token is not base64url") from e
+    if not raw or raw[0] & ~FLAG_DEFLATE != STATE_FORMAT:
+        raise ValueError("unknown state token format")
+    data = raw[1:]
+    if raw[0] & FLAG_DEFLATE:
+        inflater = zlib.decompressobj(-15)
+        try:
+            data = inflater.decompress(data)
+        except zlib.error as e:
+            raise ValueError("corrupt state token") from e
+        # zlib.decompress() would accept a cut-off stream or bytes after its end
+        if not inflater.eof or inflater.unused_data:
+            raise ValueError("corrupt state token")
+
+    pos = 0
+    texts = {}
+    for key in TEXT_KEYS:
+        n, pos = _get_varint(data, pos)
+        try:
+            texts[key] = data[pos:pos + n].decode()
+        except UnicodeDecodeError as e:
+            raise ValueError("corrupt state token") from e
+        pos += n
+    fingerprint = data[pos:pos + FINGERPRINT_BYTES]
+    pos += FINGERPRINT_BYTES
+    if len(fingerprint) != FINGERPRINT_BYTES:
+        raise ValueError("truncated state token")
+
+    bitsets = {}
+    for key in LIST_KEYS:
+        n_bits, pos = _get_varint(data, pos)
+        bits = data[pos:pos + (n_bits + 7) // 8]
+        pos += len(bits)
+        if len(bits) != (n_bits + 7) // 8:
+            raise ValueError("truncated state token")
+        bitsets[key] = (n_bits, [i for i in range(n_bits) if bits[i >> 3] >> (i & 7) & 1])
+    if pos != len(data):
+        raise ValueError("corrupt state token")
+    return {k: v for k, v in texts.items() if v}, bitsets, fingerprint
+
+
+def resolve_bitsets(bitsets: dict, fingerprint: bytes, dictionary: dict) -> dict:
+    """
+    Positions from decode_state() -> values, checked against the dictionary the token
+    was made with. Raises ValueError when that part of the dictionary has changed.
+    """
+    lengths = {key: n_bits for key, (n_bits, _) in bitsets.items()}
+    if any(n > len(dictionary.get(key, [])) for key, n in lengths.items()) or \
+            _fingerprint(dictionary, lengths) != fingerprint:
+        raise ValueError("state token was made against different data")
+    return {
+        key: [str(dictionary[key][i]) for i in positions]
+        for key, (_, positions) in bitsets.items() if positions
+    }
+
+
+def view_hash(state: dict, length: int = 10) -> str:
+    """
+    Short, stable id of a state for ?v= links (same state, same hash).
+    """
+    return hashlib.sha256(canonical_state(state).encode()).hexdigest()[:length]
+
+
+def canonical_state(state: dict) -> str:
+    return json.dumps(state, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
@@ -0,0 +1,333 @@
+"""
+Concurrent-user load test for the dashboard.
+
+Each simulated user is an AppTest session in its own process: AppTest installs
+Streamlit's Runtime as a process-wide singleton for every run, so sessions on
+threads of one process would trample each other's Runtime in a way a real server
+never does. The users run at the same time and compete for the CPU, but each
+process loads its own copy of the dataset (a server shares one), so RSS is
+reported summed over the user processes. Users perform random actions: filter
+changes, ID inputs, column toggles, latency thresholds, page flips and downloads.
+Downloads build the export the button would serve for the user's current
+filters, since AppTest cannot click a download button.
+
+Reports rerun latency percentiles, throughput, CPU and RSS per user count, and
+exits with status 1 when --budget-p95 / --budget-p99 (ms) is exceeded or any rerun
+or download raised or timed out. Those are left out of the percentiles.
+
+    python load_test.py --users 1 2 4 8 --actions 20
+    python load_test.py --db synthetic/latency_results_1M.db --users 4 16 --budget-p95 1500
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import time
+import traceback
+
+import numpy as np
+
+from latency_perf import peak_rss_bytes
+
+DASHBOARD_PATH = os.path.join(os.path.dirname(__file__), 'latency_dashboard.py')
+
+DEFAULT_USERS = [1, 2, 4, 8]
+DEFAULT_ACTIONS = 20
+
+# Relative weights of the user actions
+ACTION_WEIGHTS = {
+    'filter': 45,
+    'ids': 10,
+    'columns': 15,
+    'latency': 10,
+    'page': 15,
+    'download': 5,
+}
+
+ID_INPUTS = ["", "1-500", "100, 200-300", "1000-", "-250, !10-20", "5, 7, 9-40"]
+
+
+# ======================================================================================
+# One simulated user
+# ======================================================================================
+
+def _option_value(label: str) -> str:
+    # Filter options are shown as "value (count)"
+    return label.rsplit(" (", 1)[0]
+
+
+class User:
+    def __init__(self, user_id: int, seed: int, think: float, export_rows):
+        from streamlit.testing.v1 import AppTest
+
+        self.rng = random.Random(seed * 1_000 + user_id)
+        self.think = think
+        self.export_rows = export_rows
+        self.at = AppTest.from_file(DASHBOARD_PATH, default_timeout=600)
+        self.latencies = []
+        self.actions = []
+        # Per action: did it raise (its latency is then not a real rerun)
+        self.failed = []
+        self.errors = []
+
+    def _record(self, action: str, start: float, error: str | None = None) -> None:
+        self.latencies.append((time.perf_counter() - start) * 1000)
+        self.actions.append(action)
+        self.failed.append(error is not None)
+        if error is not None:
+            self.errors.append(f"{action}: {error[:200]}")
+
+    def _rerun(self, action: str, element=None) -> None:
+        start = time.perf_counter()
+        try:
+            (element or self.at).run()
+        except Exception as e:
+            # at.run() raises when the script does not finish within its timeout
+            self._record(action, start, repr(e))
+        else:
+            self._record(action, start, self.at.exception[0].message if self.at.exception else None)
+
+    def _by_key(self, widgets, prefix: str):
+        return [w for w in widgets if w.key and w.key.startswith(prefix)]
+
+    def act(self) -> None:
+        action = self.rng.choices(list(ACTION_WEIGHTS), weights=list(ACTION_WEIGHTS.values()))[0]
+        at = self.at
+        if action == 'filter':
+            widget = self.rng.choice(list(at.multiselect))
+            if widget.value and self.rng.random() < 0.5:
+                self._rerun(action, widget.unselect(self.rng.choice(widget.value)))
+            elif widget.options:
+                self._rerun(action, widget.select(_option_value(self.rng.choice(widget.options))))
+            else:
+                self._rerun(action)
+        elif action == 'ids':
+            widget = self._by_key(at.text_input, 'f_id_input')[0]
+            self._rerun(action, widget.input(self.rng.choice(ID_INPUTS)))
+        elif action == 'columns':
+            widget = self.rng.choice(self._by_key(at.checkbox, 'col_'))
+            self._rerun(action, widget.set_value(not widget.value))
+        elif action == 'latency':
+            lat_type = self._by_key(at.radio, 'f_lat_type')[0]
+            lat_type.set_value(self.rng.choice(["Show All", "Above", "Below"]))
+            threshold = self._by_key(at.number_input, 'f_lat_thresh')[0]
+            self._rerun(action, threshold.set_value(round(self.rng.uniform(0, 60), 1)))
+        elif action == 'page':
+            widget = self._by_key(at.number_input, 'page__')[0]
+            self._rerun(action, widget.set_value(self.rng.randint(1, 5)))
+        else:
+            self._download()
+        if self.think:
+            time.sleep(self.rng.expovariate(1 / self.think))
+
+    def _download(self) -> None:
+        # What the download button's callable would build for this user's filters
+        from latency_display import FILTER_KEYS, display_columns_map
+        from latency_export import STREAM_FORMATS, excel_bytes, stream_bytes
+
+        selections = {column: list(self.at.session_state[state_key]) if state_key in self.at.session_state else []
+                      for _, state_key, column, _ in FILTER_KEYS}
+        df, index = _shared_frame()
+        _, mask = index.facets(selections)
+        export_df = df[index.flags(mask)].head(self.export_rows).rename(columns=display_columns_map)
+        export_format = self.rng.choice(["Excel"] + list(STREAM_FORMATS))
+
+        start = time.perf_counter()
+        try:
+            if export_format == "Excel":
+                excel_bytes(export_df)
+            else:
+                stream_bytes(export_format, export_df)
+        except Exception as e:
+            self._record('download', start, f"{export_format}: {e!r}")
+        else:
+            self._record('download', start)
+
+
+_frame = None
+
+
+def _shared_frame():
+    # One frame + bitmap index for this user's simulated downloads
+    global _frame
+    if _frame is None:
+        from sqlalchemy import create_engine
+
+        from latency_data import DB_PATH, IncrementalLoader
+        from latency_filters import BitmapIndex
+
+        df, _ = IncrementalLoader(create_engine(f'sqlite:///{DB_PATH}')).refresh()
+        _frame = (df, BitmapIndex(df))
+    return _frame
+
+
+# ======================================================================================
+# One user count (one process per user)
+# ======================================================================================
+
+def _user_process(user_id: int, actions: int, seed: int, think: float, export_rows, barrier, results) -> None:
+    try:
+        user = User(user_id, seed, think, export_rows)
+        # First load is measured separately: it is dominated by the cold cache
+        user._rerun('first_run')
+        barrier.wait()
+        started_wall, started_cpu = time.time(), time.process_time()
+        for _ in range(actions):
+            user.act()
+        results.put({
+            'first': user.latencies[0] if not user.failed[0] else None,
+            'steps': list(zip(user.actions, user.latencies, user.failed))[1:],
+            'errors': user.errors,
+            'started': started_wall,
+            'finished': time.time(),
+            'cpu_s': time.process_time() - started_cpu,
+            'peak_rss': peak_rss_bytes(),
+        })
+    except Exception:
+        # Release the others instead of leaving them waiting at the barrier for this user
+        barrier.abort()
+        results.put({'crashed': traceback.format_exc(limit=3)})
+
+
+def run_level(n_users: int, actions: int, seed: int, think: float, export_rows) -> dict:
+    # spawn: every user starts from a fresh interpreter (no Runtime, caches or threads inherited)
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(n_users)
+    results = context.Queue()
+    processes = [
+        context.Process(target=_user_process, args=(i, actions, seed, think, export_rows, barrier, results))
+        for i in range(n_users)
+    ]
+    for process in processes:
+        process.start()
+
+    reports = []
+    while len(reports) < n_users:
+        try:
+            reports.append(results.get(timeout=1))
+        except queue.Empty:
+            if not any(p.is_alive() for p in processes):
+                # One last look for a report put just before its process exited; a process
+                # killed outright (e.g. out of memory) never reports at all
+                try:
+                    reports.append(results.get(timeout=1))
+                except queue.Empty:
+                    break
+    for process in processes:
+        process.join()
+
+    crashed = [r['crashed'] for r in reports if 'crashed' in r]
+    crashed += ["user process exited without reporting"] * (n_users - len(reports))
+    users = [r for r in reports if 'crashed' not in r]
+
+    # Only actions that completed count towards the latencies
+    first = [u['first'] for u in users if u['first'] is not None]
+    done = [u['steps'] for u in users]
+    reruns = np.array([ms for steps in done for a, ms, failed in steps if a != 'download' and not failed])
+    downloads = [ms for steps in done for a, ms, failed in steps if a == 'download' and not failed]
+    wall = (max(u['finished'] for u in users) - min(u['started'] for u in users)) if users else 0.0
+    cpu = sum(u['cpu_s'] for u in users)
+    rss = [u['peak_rss'] for u in users if u['peak_rss']]
+    errors = [e for u in users for e in u['errors']] + [f"user crashed: {c.strip().splitlines()[-1]}" for c in crashed]
+
+    def pct(values, q):
+        return round(float(np.percentile(values, q)), 1) if len(values) else None
+
+    return {
+        'users': n_users,
+        'reruns': int(len(reruns)),
+        'downloads': len(downloads),
+        'error_count': len(errors),
+        'errors': errors[:20],
+        'first_run_ms': pct(first, 50),
+        'p50_ms': pct(reruns, 50),
+        'p90_ms': pct(reruns, 90),
+        'p95_ms': pct(reruns, 95),
+        'p99_ms': pct(reruns, 99),
+        'max_ms': round(float(reruns.max()), 1) if len(reruns) else None,
+        'download_p95_ms': pct(downloads, 95),
+        'throughput_per_s': round(len(reruns) / wall, 2) if wall else None,
+        'cpu_avg_pct': round(cpu / wall * 100, 1) if wall else None,
+        'rss_sum_mb': round(sum(rss) / 1e6, 1) if rss else None,
+    }
+
+
+# ======================================================================================
+# Runner
+# ======================================================================================
+
+COLUMNS = [
+    ('users', 'users', '{:>6}'),
+    ('reruns', 'reruns', '{:>7}'),
+    ('p50_ms', 'p50', '{:>8}'),
+    ('p90_ms', 'p90', '{:>8}'),
+    ('p95_ms', 'p95', '{:>8}'),
+    ('p99_ms', 'p99', '{:>8}'),
+    ('max_ms', 'max', '{:>8}'),
+    ('download_p95_ms', 'dl p95', '{:>8}'),
+    ('throughput_per_s', 'rerun/s', '{:>8}'),
+    ('cpu_avg_pct', 'cpu %', '{:>7}'),
+    ('rss_sum_mb', 'rss MB', '{:>8}'),
+    ('error_count', 'errors', '{:>7}'),
+]
+
+
+def print_table(levels: list[dict]) -> None:
+    print("".join(fmt.format(title) for _, title, fmt in COLUMNS))
+    for level in levels:
+        print("".join(fmt.format('-' if level[k] is None else level[k]) for k, _, fmt in COLUMNS))
+    print("(rerun latencies in ms, without the reruns that raised; downloads reported separately)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simulate concurrent dashboard users")
+    parser.add_argument('--users', nargs='+', type=int, default=DEFAULT_USERS, help="user counts to run, e.g. 1 4 16")
+    parser.add_argument('--actions', type=int, default=DEFAULT_ACTIONS, help="actions per user")
+    parser.add_argument('--think', type=float, default=0.0, help="mean think time between actions (s)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for the user actions")
+    parser.add_argument('--db', help="DB to serve (default: latency_data.DB_PATH / LATENCY_DB)")
+    parser.add_argument('--export-rows', type=int, default=50_000, help="cap on rows per simulated download")
+    parser.add_argument('--budget-p95', type=float, help="fail if any level's p95 rerun latency (ms) is above")
+    parser.add_argument('--budget-p99', type=float, help="fail if any level's p99 rerun latency (ms) is above")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    # Inherited by the user processes, which import the dashboard modules fresh
+    os.environ['LATENCY_PERF_LOG'] = os.devnull
+    if args.db:
+        os.environ['LATENCY_DB'] = os.path.abspath(args.db)
+
+    levels = []
+    for n in args.users:
+        print(f"👥 {n} user(s) ...", flush=True)
+        levels.append(run_level(n, args.actions, args.seed, args.think, args.export_rows))
+
+    print_table(levels)
+    for level in levels:
+        for error in level['errors']:
+            print(f"⚠️ {level['users']} users: {error}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(levels, f, indent=2)
+
+    failed = []
+    for level in levels:
+        for key, budget in [('p95_ms', args.budget_p95), ('p99_ms', args.budget_p99)]:
+            if budget is not None and level[key] is not None and level[key] > budget:
+                failed.append(f"{level['users']} users: {key[:3]} {level[key]:,.0f} ms > budget {budget:,.0f} ms")
+    errored = [f"{level['users']} users: {level['error_count']} error(s)" for level in levels if level['error_count']]
+    if failed:
+        print("❌ Latency budget exceeded:\n  " + "\n  ".join(failed))
+    if errored:
+        print("❌ Errors during the run:\n  " + "\n  ".join(errored))
+    if failed or errored:
+        sys.exit(1)
+    if args.budget_p95 is not None or args.budget_p99 is not None:
+        print("✅ Within latency budget.")
+
+
+if __name__ == '__main__':
+    main()
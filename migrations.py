@@ -0,0 +1,276 @@
+"""
+Versioned schema migrations for latency_results.db.
+
+Applied versions are recorded in the `schema_version` table, so running this again
+only applies what is missing. Every migration is followed by ANALYZE so SQLite's
+planner has fresh statistics for the dashboard's pushdown queries.
+
+    python migrations.py                # apply pending migrations to latency_results.db
+    python migrations.py --status       # show applied / pending versions
+    python migrations.py --db G:\\path\\to\\latency_results.db
+
+Migrations that rewrite existing rows (the typed-column backfill) run in small
+batches, each in its own short transaction, so the test rigs can keep inserting.
+
+Run this as part of every dashboard deploy. The dashboard never migrates by itself,
+and on a DB without migration 007 its loader cannot tell appended rows from rewritten
+ones, so every DB change reloads the whole table (the sidebar then says so).
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'latency_results.db')
+
+# Sidebar filters in the dashboard's cascade order
+CASCADE_COLUMNS = [
+    'product_name',
+    'hardware_version',
+    'firmware_version',
+    'traffic_generator_application',
+    'system_mode',
+    'client_service_type',
+    'client_fec_mode',
+    'uplink_service_type',
+    'uplink_fec_mode',
+    'modulation_format',
+    'uplink_transceiver',
+    'frame_size',
+]
+
+
+# Backfill batches: rows per transaction and pause between transactions (seconds)
+BACKFILL_BATCH = 2000
+BACKFILL_PAUSE = 0.01
+
+# Once this version is applied, result_us / ts_epoch_us are filled for every row
+TYPED_COLUMNS_VERSION = 5
+
+# VARCHAR result -> REAL latency in uSec (NULL when not numeric, like pd.to_numeric(errors='coerce'))
+RESULT_US_SQL = (
+    "CASE WHEN trim({0}) GLOB '*[0-9]*' AND trim({0}) NOT GLOB '*[^0-9.eE+-]*' "
+    "THEN CAST(trim({0}) AS REAL) END"
+)
+
+# 'YYYY-MM-DD HH:MM:SS[.ffffff]' text -> integer microseconds since the epoch (naive wall clock).
+# strftime() only gets the whole seconds: given the fraction it rounds it to milliseconds
+# first, which pushes .9995 and up into the next second.
+TS_EPOCH_US_SQL = (
+    "CAST(strftime('%s', substr({0}, 1, 19)) AS INTEGER) * 1000000 "
+    "+ CAST(substr({0} || '000000', 21, 6) AS INTEGER)"
+)
+
+
+def _columns(conn, table: str) -> set[str]:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table});")}
+
+
+# ======================================================================================
+# Migrations (append only - never edit or renumber one that has shipped)
+# ======================================================================================
+
+def _m001_uplink_transceiver(conn) -> None:
+    # Was add_module_type_column.py; older DBs may already have the column
+    if 'uplink_transceiver' not in _columns(conn, 'test_results'):
+        conn.execute("ALTER TABLE test_results ADD COLUMN uplink_transceiver TEXT;")
+
+
+def _m002_filter_indexes(conn) -> None:
+    for column in ['product_name', 'firmware_version', 'frame_size', 'datetime']:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS ix_test_results_{column} ON test_results ({column});")
+
+
+def _m003_cascade_index(conn) -> None:
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS ix_test_results_cascade ON test_results ({', '.join(CASCADE_COLUMNS)});"
+    )
+
+
+def _m004_typed_columns(conn) -> None:
+    columns = _columns(conn, 'test_results')
+    if 'result_us' not in columns:
+        conn.execute("ALTER TABLE test_results ADD COLUMN result_us REAL;")
+    if 'ts_epoch_us' not in columns:
+        conn.execute("ALTER TABLE test_results ADD COLUMN ts_epoch_us INTEGER;")
+
+    # Keep the typed columns in step with whatever the rigs insert or fix afterwards
+    typed_update = (
+        f"UPDATE test_results SET result_us = {RESULT_US_SQL.format('NEW.result')}, "
+        f"ts_epoch_us = {TS_EPOCH_US_SQL.format('NEW.datetime')} WHERE id = NEW.id;"
+    )
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_test_results_typed_insert
+        AFTER INSERT ON test_results
+        BEGIN {typed_update} END;
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_test_results_typed_update
+        AFTER UPDATE OF result, datetime ON test_results
+        BEGIN {typed_update} END;
+    """)
+
+
+def _m005_backfill_typed_columns(conn) -> None:
+    # Rows inserted from here on are covered by the triggers of 004
+    min_id, max_id = conn.execute("SELECT MIN(id), MAX(id) FROM test_results;").fetchone()
+    if min_id is None:
+        return
+
+    lo = min_id - 1
+    while lo < max_id:
+        hi = lo + BACKFILL_BATCH
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            conn.execute(
+                f"UPDATE test_results SET result_us = {RESULT_US_SQL.format('result')}, "
+                f"ts_epoch_us = {TS_EPOCH_US_SQL.format('datetime')} "
+                f"WHERE id > ? AND id <= ?;",
+                (lo, hi),
+            )
+            conn.execute("COMMIT;")
+        except Exception:
+            conn.execute("ROLLBACK;")
+            raise
+        lo = hi
+        time.sleep(BACKFILL_PAUSE)
+
+
+def _m006_saved_views(conn) -> None:
+    # Dashboard short links (?v=<hash>): the full URL state, keyed by its content hash
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS saved_views (
+            hash TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        );
+    """)
+
+
+def _m007_rewrite_counter(conn) -> None:
+    # One row counting UPDATEs / DELETEs of test_results, so the dashboard's loader can
+    # tell "only appended" from "rewritten below the watermark" without scanning rows.
+    # The typed columns are left out of UPDATE OF: the insert trigger of 004 fills them,
+    # and that must not count as a rewrite.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS test_results_changes (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            rewrites INTEGER NOT NULL
+        );
+    """)
+    conn.execute("INSERT OR IGNORE INTO test_results_changes (id, rewrites) VALUES (0, 0);")
+    bump = "UPDATE test_results_changes SET rewrites = rewrites + 1 WHERE id = 0;"
+    watched = sorted(_columns(conn, 'test_results') - {'result_us', 'ts_epoch_us'})
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_test_results_count_update
+        AFTER UPDATE OF {', '.join(watched)} ON test_results
+        BEGIN {bump} END;
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_test_results_count_delete
+        AFTER DELETE ON test_results
+        BEGIN {bump} END;
+    """)
+
+
+# (version, description, function, transactional)
+# Non-transactional migrations manage their own (batched) transactions and must be
+# safe to re-run if interrupted; the version is only recorded once they finish.
+MIGRATIONS = [
+    (1, "add test_results.uplink_transceiver", _m001_uplink_transceiver, True),
+    (2, "indexes on product_name, firmware_version, frame_size, datetime", _m002_filter_indexes, True),
+    (3, "composite index in sidebar cascade order", _m003_cascade_index, True),
+    (4, "typed result_us / ts_epoch_us columns + sync triggers", _m004_typed_columns, True),
+    (TYPED_COLUMNS_VERSION, "batched backfill of result_us / ts_epoch_us", _m005_backfill_typed_columns, False),
+    (6, "saved_views table for dashboard short links", _m006_saved_views, True),
+    (7, "test_results rewrite counter + update/delete triggers", _m007_rewrite_counter, True),
+]
+
+
+# ======================================================================================
+# Runner
+# ======================================================================================
+
+def _ensure_version_table(conn) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        );
+    """)
+
+
+def applied_versions(conn) -> set[int]:
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version';"
+    ).fetchone()
+    if not exists:
+        return set()
+    return {row[0] for row in conn.execute("SELECT version FROM schema_version;")}
+
+
+def migrate(db_path: str = DB_PATH, verbose: bool = True) -> list[int]:
+    """
+    Apply all pending migrations in version order, each in its own transaction.
+    Returns the versions that were applied.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 5000;")
+    applied_now = []
+    try:
+        _ensure_version_table(conn)
+        applied = applied_versions(conn)
+        for version, description, func, transactional in MIGRATIONS:
+            if version in applied:
+                continue
+
+            if not transactional:
+                func(conn)
+            conn.execute("BEGIN IMMEDIATE;")
+            try:
+                if transactional:
+                    func(conn)
+                conn.execute(
+                    "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?);",
+                    (version, description, datetime.now().isoformat(timespec='seconds')),
+                )
+                conn.execute("COMMIT;")
+            except Exception:
+                conn.execute("ROLLBACK;")
+                raise
+
+            conn.execute("ANALYZE;")
+            applied_now.append(version)
+            if verbose:
+                print(f"✅ Applied migration {version:03d}: {description}")
+    finally:
+        conn.close()
+
+    if verbose and not applied_now:
+        print("✅ Schema is up to date.")
+    return applied_now
+
+
+def print_status(db_path: str = DB_PATH) -> None:
+    conn = sqlite3.connect(db_path)
+    try:
+        applied = applied_versions(conn)
+    finally:
+        conn.close()
+    for version, description, _, _ in MIGRATIONS:
+        state = "applied" if version in applied else "pending"
+        print(f"{version:03d}  {state:8}  {description}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Apply schema migrations to latency_results.db")
+    parser.add_argument('--db', default=DB_PATH, help="path to the SQLite database")
+    parser.add_argument('--status', action='store_true', help="list migrations without applying them")
+    args = parser.parse_args()
+
+    if args.status:
+        print_status(args.db)
+    else:
+        migrate(args.db)
@@ -0,0 +1,254 @@
+"""
+Synthetic latency_results.db files for scale testing.
+
+Learns the shape of the real test_results table - devices (serial / part / hardware
+numbers per product), their firmware versions, the step configurations each product
+is tested with and the frame sizes of each step, latency per configuration and frame
+size, steps per run and the gaps between runs - and replays it at any size.
+
+A run is what the rigs write in one go: one device on one firmware, one timestamp,
+a sequence of steps, one row per frame size of each step. Same seed, same source
+and same size give the same file.
+
+    python synthetic_db.py                                  # 10k, 100k, 1M, 10M into ./synthetic/
+    python synthetic_db.py --rows 100k 1M --seed 7
+    python synthetic_db.py --rows 50000 --out-dir D:\\bench --migrate
+
+    LATENCY_DB=synthetic/latency_results_1M.db streamlit run latency_dashboard.py
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from migrations import migrate
+
+SOURCE_DB = os.path.join(os.path.dirname(__file__), 'latency_results.db')
+OUT_DIR = os.path.join(os.path.dirname(__file__), 'synthetic')
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1M': 1_000_000, '10M': 10_000_000}
+
+DEVICE_COLUMNS = ['product_name', 'serial_number', 'part_number', 'hardware_version']
+
+# Everything that defines one test step besides the device and the frame size
+STEP_COLUMNS = [
+    'traffic_generator_application',
+    'system_mode',
+    'client_service_type',
+    'client_fec_mode',
+    'uplink_service_type',
+    'uplink_fec_mode',
+    'modulation_format',
+    'uplink_transceiver',
+]
+
+INSERT_COLUMNS = (
+    ['id', 'datetime'] + DEVICE_COLUMNS + ['firmware_version', 'step'] + STEP_COLUMNS + ['frame_size', 'result']
+)
+
+# A lab writes runs for years, not centuries: inter-run gaps are scaled down to fit,
+# and the synthetic history ends where the source's does
+MAX_SPAN_DAYS = 5 * 365
+
+# Relative latency jitter for configurations measured only once in the source
+MIN_RELATIVE_STD = 0.002
+
+INSERT_BATCH = 200_000
+
+
+def parse_size(text: str) -> int:
+    """
+    "10k" / "1M" / "250000" -> number of rows.
+    """
+    text = text.strip()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(text[-1:].lower(), 1)
+    number = text[:-1] if multiplier > 1 else text
+    return int(float(number) * multiplier)
+
+
+def size_label(rows: int) -> str:
+    for label, n in SIZES.items():
+        if n == rows:
+            return label
+    return str(rows)
+
+
+def _none(value):
+    return None if pd.isna(value) else value
+
+
+class SourceModel:
+    """
+    Empirical distributions of the source DB, read once (deterministically, by id).
+    """
+
+    def __init__(self, source_db: str = SOURCE_DB):
+        conn = sqlite3.connect(source_db)
+        try:
+            self.create_sql = conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'test_results';"
+            ).fetchone()[0]
+            df = pd.read_sql("SELECT * FROM test_results ORDER BY id", conn)
+        finally:
+            conn.close()
+
+        df['latency'] = pd.to_numeric(df['result'], errors='coerce')
+        df['run_start'] = pd.to_datetime(df['datetime'])
+        self.rows = len(df)
+        self.last_run = df['run_start'].max().to_pydatetime()
+
+        # Devices, weighted by how many runs each one has
+        runs = df.drop_duplicates('datetime')
+        devices = runs.groupby(DEVICE_COLUMNS, sort=True, dropna=False).size()
+        self.devices = [tuple(_none(v) for v in key) for key in devices.index]
+        self.device_weights = (devices / devices.sum()).to_numpy()
+
+        self.firmware = {}
+        for i, key in enumerate(self.devices):
+            mask = runs['serial_number'].eq(key[1]) & runs['product_name'].eq(key[0])
+            counts = runs.loc[mask, 'firmware_version'].value_counts().sort_index()
+            self.firmware[i] = (counts.index.tolist(), (counts / counts.sum()).to_numpy())
+
+        # Step configurations per product, in the order they were first run, each with
+        # its frame sizes and (mean, std) latency per frame size
+        self.configs = []
+        self.product_configs = {}
+        keyed = df.assign(_key=list(zip(*(df[c].map(_none) for c in ['product_name'] + STEP_COLUMNS))))
+        for key, group in keyed.groupby('_key', sort=False):
+            stats = group.groupby('frame_size', sort=False, dropna=False)['latency'].agg(['mean', 'std'])
+            frames = []
+            for frame_size, (mean, std) in stats.iterrows():
+                mean = 0.0 if pd.isna(mean) else float(mean)
+                std = 0.0 if pd.isna(std) else float(std)
+                frames.append((_none(frame_size), mean, max(std, abs(mean) * MIN_RELATIVE_STD)))
+            self.product_configs.setdefault(key[0], []).append(len(self.configs))
+            self.configs.append((key[1:], frames))
+
+        self.steps_per_run = df.groupby('datetime')['step'].nunique().to_numpy()
+        self.first_step = int(df['step'].min())
+
+        starts = np.sort(runs['run_start'].unique())
+        self.run_gaps = np.diff(starts).astype('timedelta64[us]').astype(np.int64)
+        ids = df['id'].to_numpy()
+        self.id_skip_rate = (ids[-1] - ids[0] + 1 - len(ids)) / max(len(ids), 1)
+
+
+def _plan_runs(model: SourceModel, rows: int, rng: np.random.Generator) -> list:
+    # (device index, firmware, [config indexes]) per run, until `rows` rows are covered
+    plan = []
+    total = 0
+    while total < rows:
+        device = int(rng.choice(len(model.devices), p=model.device_weights))
+        versions, weights = model.firmware[device]
+        firmware = versions[int(rng.choice(len(versions), p=weights))]
+        candidates = model.product_configs[model.devices[device][0]]
+        n_steps = int(rng.choice(model.steps_per_run))
+        if n_steps <= len(candidates):
+            picked = np.sort(rng.choice(len(candidates), size=n_steps, replace=False))
+        else:
+            picked = rng.choice(len(candidates), size=n_steps, replace=True)
+        configs = [candidates[i] for i in picked]
+        plan.append((device, firmware, configs))
+        total += sum(len(model.configs[c][1]) for c in configs)
+    return plan
+
+
+def _run_starts(model: SourceModel, n_runs: int, rng: np.random.Generator) -> np.ndarray:
+    gaps = rng.choice(model.run_gaps, size=n_runs).astype(np.float64) if len(model.run_gaps) else np.full(n_runs, 60e6)
+    gaps[0] = 0
+    span = gaps.sum()
+    max_span = MAX_SPAN_DAYS * 86400e6
+    if span > max_span:
+        gaps *= max_span / span
+    # Offsets back from the source's last run, so no run lands in the future
+    offsets = np.cumsum(gaps)
+    return (offsets - offsets[-1]).astype(np.int64)
+
+
+def _format_latency(value: float) -> str:
+    # Like the rigs: plain decimal text, trailing zeros dropped
+    return f"{value:.4f}".rstrip('0').rstrip('.')
+
+
+def generate(path: str, rows: int, seed: int = 0, model: SourceModel | None = None, verbose: bool = True) -> str:
+    """
+    Write a test_results DB of exactly `rows` rows to `path` (replaced if it exists).
+    """
+    model = model or SourceModel()
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+
+    plan = _plan_runs(model, rows, rng)
+    starts = _run_starts(model, len(plan), rng)
+
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = OFF;")
+    conn.execute("PRAGMA synchronous = OFF;")
+    conn.execute(model.create_sql)
+    insert = (
+        f"INSERT INTO test_results ({', '.join(INSERT_COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in INSERT_COLUMNS)});"
+    )
+
+    batch = []
+    written = 0
+    next_id = 1
+    for (device, firmware, configs), start_us in zip(plan, starts):
+        stamp = (model.last_run + timedelta(microseconds=int(start_us))).strftime('%Y-%m-%d %H:%M:%S.%f')
+        device_values = model.devices[device]
+        frames = [
+            (step, model.configs[c][0], frame)
+            for step, c in enumerate(configs, start=model.first_step)
+            for frame in model.configs[c][1]
+        ]
+        frames = frames[:rows - written]
+        latencies = rng.normal([f[2][1] for f in frames], [f[2][2] for f in frames])
+        skips = rng.random(len(frames)) < model.id_skip_rate
+        for (step, cfg, (frame_size, _, _)), latency, skip in zip(frames, latencies, skips):
+            next_id += int(skip)
+            batch.append(
+                (next_id, stamp, *device_values, firmware, step, *cfg, frame_size, _format_latency(max(latency, 0.0)))
+            )
+            next_id += 1
+        written += len(frames)
+
+        if len(batch) >= INSERT_BATCH:
+            conn.executemany(insert, batch)
+            batch = []
+    if batch:
+        conn.executemany(insert, batch)
+    conn.commit()
+    conn.execute("PRAGMA journal_mode = DELETE;")
+    conn.close()
+
+    if verbose:
+        print(f"✅ {path}: {written:,} rows, {len(plan):,} runs, "
+              f"{os.path.getsize(path) / 1e6:,.1f} MB in {time.perf_counter() - started:,.1f}s")
+    return path
+
+
+def output_path(rows: int, out_dir: str = OUT_DIR) -> str:
+    return os.path.join(out_dir, f"latency_results_{size_label(rows)}.db")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate synthetic latency_results.db files")
+    parser.add_argument('--rows', nargs='+', default=list(SIZES), help="sizes, e.g. 10k 100k 1M 10M or 250000")
+    parser.add_argument('--seed', type=int, default=0, help="random seed (same seed -> same file)")
+    parser.add_argument('--source', default=SOURCE_DB, help="DB to learn the distributions from")
+    parser.add_argument('--out-dir', default=OUT_DIR, help="where to write latency_results_<size>.db")
+    parser.add_argument('--migrate', action='store_true', help="also apply migrations.py (indexes, typed columns)")
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    source_model = SourceModel(args.source)
+    for size in args.rows:
+        db = generate(output_path(parse_size(size), args.out_dir), parse_size(size), args.seed, source_model)
+        if args.migrate:
+            migrate(db, verbose=False)
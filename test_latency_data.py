@@ -0,0 +1,217 @@
+"""
+Tests for the shared in-memory dataset (latency_data.IncrementalLoader / prepare_frame):
+parsing, and when a refresh is a delta and when a full reload.
+
+    python -m pytest -q test_latency_data.py
+"""
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from latency_data import DIMENSION_COLUMNS, LAZY_COLUMNS, IncrementalLoader
+
+
+def make_db(path: str, rows: list[dict], migrated: bool) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE test_results (id INTEGER PRIMARY KEY, datetime TEXT, result VARCHAR, "
+        + ", ".join(f"{c} TEXT" for c in DIMENSION_COLUMNS + LAZY_COLUMNS) + ")"
+    )
+    conn.commit()
+    conn.close()
+    if migrated:
+        from migrations import migrate
+        migrate(path, verbose=False)
+    insert(path, rows)
+
+
+def insert(path: str, rows: list[dict]) -> None:
+    conn = sqlite3.connect(path)
+    for row in rows:
+        row = {'datetime': '2024-01-01 00:00:00.000000', 'result': '1.0', 'product_name': "PL-1000", **row}
+        conn.execute(
+            f"INSERT INTO test_results ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+            list(row.values()),
+        )
+    conn.commit()
+    conn.close()
+
+
+def execute(path: str, sql: str) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute(sql)
+    conn.commit()
+    conn.close()
+
+
+def refresh(loader: IncrementalLoader, extra_columns=()):
+    # The tests write faster than the DB file's mtime moves; force a look at the DB
+    loader.change_signal = None
+    return loader.refresh(extra_columns)
+
+
+@pytest.fixture(params=[True, False], ids=["migrated", "unmigrated"])
+def db(tmp_path, request):
+    path = str(tmp_path / "latency_results.db")
+    rows = [{'result': str(i / 4), 'firmware_version': f"1.{i % 3}", 'serial_number': f"SN{i}"} for i in range(50)]
+    make_db(path, rows, request.param)
+    return path
+
+
+@pytest.fixture
+def loader(db):
+    return IncrementalLoader(create_engine(f"sqlite:///{db}"))
+
+
+# ======================================================================================
+# Parsing
+# ======================================================================================
+
+def test_result_is_float64(loader):
+    df, _ = refresh(loader)
+    assert df['result'].dtype == np.float64
+    assert df['result'].tolist() == [i / 4 for i in range(50)]
+
+
+@pytest.mark.parametrize("result", [None, "", "n/a"])
+def test_delta_without_numeric_results_keeps_result_float64(db, loader, result):
+    refresh(loader)
+    insert(db, [{'result': result}])
+    df, _ = refresh(loader)
+    assert df['result'].dtype == np.float64
+    assert np.isnan(df['result'].iloc[-1])
+    # The latency filters compare it as a number
+    assert np.count_nonzero(df['result'].to_numpy() > 10.0) == 9
+
+
+def test_derived_frames_do_not_change_the_shared_one(loader):
+    # Relies on pandas 3 copy-on-write (requirements.txt pins pandas>=3)
+    df, _ = refresh(loader)
+    page = df.take([0, 1])
+    page.loc[page.index[0], 'result'] = -1.0
+    column = df['result']
+    column.iloc[0] = -1.0
+    assert loader.df['result'].min() == 0.0
+
+
+# ======================================================================================
+# Delta vs full reload
+# ======================================================================================
+
+def assert_same_as_a_fresh_load(loader: IncrementalLoader) -> None:
+    fresh, _ = IncrementalLoader(loader.engine).refresh(sorted(loader.lazy_loaded))
+    pd.testing.assert_frame_equal(loader.df, fresh)
+
+
+def migrated(db: str) -> bool:
+    conn = sqlite3.connect(db)
+    try:
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'schema_version'").fetchone() is not None
+    finally:
+        conn.close()
+
+
+def test_unchanged_db_is_a_cache_hit(loader):
+    df, version = refresh(loader)
+    assert loader.full_loads == 1
+    assert loader.refresh() == (df, version)
+    assert (loader.hits, loader.reloads) == (1, 1)
+
+
+def test_appended_rows_are_a_delta(db, loader):
+    _, version = refresh(loader)
+    insert(db, [{'result': "99", 'firmware_version': "2.0"}, {'result': "7"}])
+    df, new_version = refresh(loader)
+    assert new_version == version + 1
+    assert len(df) == 52
+    assert df['firmware_version'].cat.categories.tolist() == ["1.0", "1.1", "1.2", "2.0"]
+    if migrated(db):
+        assert (loader.full_loads, loader.delta_loads) == (1, 1)
+        assert loader.incremental
+    else:
+        # Without the rewrite counter nothing tells an append from a rewrite
+        assert (loader.full_loads, loader.delta_loads) == (2, 0)
+        assert not loader.incremental
+    assert_same_as_a_fresh_load(loader)
+
+
+def test_no_new_rows_keeps_the_version(db, loader):
+    if not migrated(db):
+        pytest.skip("every change is a full reload")
+    df, version = refresh(loader)
+    assert refresh(loader) == (df, version)
+    assert loader.delta_loads == 0
+
+
+@pytest.mark.parametrize("sql", [
+    "UPDATE test_results SET result = '42' WHERE id = 3",
+    "UPDATE test_results SET product_name = 'PL-2000' WHERE id = 3",
+    "DELETE FROM test_results WHERE id = 10",
+])
+def test_rewrites_below_the_watermark_are_a_full_reload(db, loader, sql):
+    _, version = refresh(loader)
+    execute(db, sql)
+    _, new_version = refresh(loader)
+    assert new_version == version + 1
+    assert (loader.full_loads, loader.delta_loads) == (2, 0)
+    assert_same_as_a_fresh_load(loader)
+
+
+def test_deleted_newest_rows_are_a_full_reload(db, loader):
+    # SQLite hands the deleted ids out again, so the watermark alone would miss the new rows
+    refresh(loader)
+    execute(db, "DELETE FROM test_results WHERE id > 45")
+    insert(db, [{'result': "123"}])
+    df, _ = refresh(loader)
+    assert df['id'].tolist() == list(range(1, 47))
+    assert df['result'].iloc[-1] == 123.0
+    assert loader.full_loads == 2
+    assert_same_as_a_fresh_load(loader)
+
+
+def test_schema_change_is_a_full_reload(db, loader):
+    refresh(loader)
+    execute(db, "CREATE INDEX ix_test_results_result ON test_results (result)")
+    insert(db, [{'result': "5"}])
+    refresh(loader)
+    assert (loader.full_loads, loader.delta_loads) == (2, 0)
+    assert_same_as_a_fresh_load(loader)
+
+
+def test_migrating_switches_to_typed_columns(tmp_path):
+    path = str(tmp_path / "latency_results.db")
+    make_db(path, [{'result': "1.5", 'datetime': "2024-01-01 00:00:59.999900"}], migrated=False)
+    loader = IncrementalLoader(create_engine(f"sqlite:///{path}"))
+    untyped, _ = refresh(loader)
+    assert not loader.typed
+
+    from migrations import migrate
+    migrate(path, verbose=False)
+    typed, _ = refresh(loader)
+    assert loader.typed and loader.incremental
+    assert loader.full_loads == 2
+    pd.testing.assert_frame_equal(typed, untyped)
+
+    insert(path, [{'result': "2.5"}])
+    df, _ = refresh(loader)
+    assert loader.delta_loads == 1
+    assert df['result'].tolist() == [1.5, 2.5]
+
+
+def test_lazy_columns_are_added_in_place(db, loader):
+    df, version = refresh(loader)
+    assert 'serial_number' not in df.columns and 'serial_number' in loader.columns
+    df, new_version = loader.refresh(['serial_number'])
+    # Same rows: positions stay valid, so the version does not move
+    assert new_version == version
+    assert df['serial_number'].tolist() == [f"SN{i}" for i in range(50)]
+    assert list(df.columns) == [c for c in loader.columns if c != 'part_number']
+
+    # ...and from then on it is kept, deltas included
+    insert(db, [{'serial_number': "SN-new"}])
+    df, _ = refresh(loader)
+    assert df['serial_number'].iloc[-1] == "SN-new"
+    assert_same_as_a_fresh_load(loader)
@@ -0,0 +1,259 @@
+"""
+Tests for the in-memory filters (latency_filters.py): the ID box parser and its
+interval flags, the bitmap index facets, and sorted paging - the last two also
+checked against SQL pushdown (latency_data.py) on a copy of the shipped DB.
+
+    python -m pytest -q test_latency_filters.py
+"""
+import os
+import random
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from latency_data import (
+    DIMENSION_COLUMNS,
+    IncrementalLoader,
+    count_filtered,
+    facet_counts,
+    query_page,
+)
+from latency_filters import (
+    BitmapIndex,
+    _merge_intervals,
+    id_interval_flags,
+    ordered_rows,
+    parse_id_ranges,
+    sort_order,
+)
+
+SHIPPED_DB = os.path.join(os.path.dirname(__file__), 'latency_results.db')
+
+
+# ======================================================================================
+# ID filter
+# ======================================================================================
+
+@pytest.mark.parametrize("id_input, expected", [
+    ("", ([], [])),
+    (" 1 , , 3 ", ([(1, 1), (3, 3)], [])),
+    ("1, 3, 5-10", ([(1, 1), (3, 3), (5, 10)], [])),
+    ("10-5", ([(5, 10)], [])),
+    ("2000-", ([(2000, None)], [])),
+    ("-50", ([(None, 50)], [])),
+    (" 7 - 9 ", ([(7, 9)], [])),
+    ("!10-20, !7", ([], [(7, 7), (10, 20)])),
+    ("1-100, !50, ! 60-", ([(1, 100)], [(50, 50), (60, None)])),
+])
+def test_parse_id_ranges(id_input, expected):
+    assert parse_id_ranges(id_input) == expected
+
+
+@pytest.mark.parametrize("id_input", ["-", "!-", " - ", "abc", "1, x", "1-2-3", "1.5", "!"])
+def test_parse_id_ranges_rejects_garbage(id_input):
+    with pytest.raises(ValueError):
+        parse_id_ranges(id_input)
+
+
+@pytest.mark.parametrize("intervals, expected", [
+    ([], []),
+    ([(5, 10), (1, 3)], [(1, 3), (5, 10)]),
+    ([(1, 5), (6, 10)], [(1, 10)]),                     # touching
+    ([(3, 3), (4, 4), (5, 5)], [(3, 5)]),
+    ([(1, 10), (5, 20)], [(1, 20)]),                    # overlapping
+    ([(1, 20), (5, 10)], [(1, 20)]),                    # contained
+    ([(1, 5), (7, 9)], [(1, 5), (7, 9)]),               # one id apart
+    ([(3, 8), (None, 5)], [(None, 8)]),
+    ([(2, 12), (10, None)], [(2, None)]),
+    ([(None, 5), (6, None)], [(None, None)]),
+    ([(None, 5), (None, 2)], [(None, 5)]),
+    ([(20, None), (1, 2), (22, 30)], [(1, 2), (20, None)]),
+])
+def test_merge_intervals(intervals, expected):
+    assert _merge_intervals(intervals) == expected
+
+
+def _naive_flags(ids, include, exclude):
+    def inside(i, lo, hi):
+        return (lo is None or i >= lo) and (hi is None or i <= hi)
+    return np.array([
+        (not include or any(inside(i, lo, hi) for lo, hi in include))
+        and not any(inside(i, lo, hi) for lo, hi in exclude)
+        for i in ids
+    ], dtype=bool)
+
+
+def test_id_interval_flags_match_a_naive_filter():
+    rng = random.Random(0)
+    ids = np.array(sorted(rng.sample(range(1, 400), 150)), dtype=np.int32)
+
+    def bound():
+        return None if rng.random() < 0.15 else rng.randint(0, 410)
+
+    def part(lo, hi) -> str:
+        if lo is not None and lo == hi:
+            return str(lo)
+        return f"{'' if lo is None else lo}-{'' if hi is None else hi}"
+
+    for _ in range(300):
+        parts, raw = [], {'': [], '!': []}
+        for _ in range(rng.randint(0, 4)):
+            lo, hi = bound(), bound()
+            if lo is None and hi is None:
+                continue
+            sign = "!" if rng.random() < 0.3 else ""
+            parts.append(sign + part(lo, hi))
+            raw[sign].append((lo, hi) if lo is None or hi is None or lo <= hi else (hi, lo))
+        # Merged and searchsorted vs. every interval as typed, checked id by id
+        include, exclude = parse_id_ranges(", ".join(parts))
+        assert np.array_equal(id_interval_flags(ids, include, exclude), _naive_flags(ids, raw[''], raw['!'])), parts
+
+
+def test_id_interval_flags_edges():
+    ids = np.array([2, 4, 6, 8], dtype=np.int32)
+    assert id_interval_flags(ids, [], []).all()
+    assert id_interval_flags(ids, [(None, None)], []).all()
+    assert id_interval_flags(ids, [], [(None, None)]).sum() == 0
+    assert id_interval_flags(ids, [(3, 3), (9, None)], []).sum() == 0
+    assert id_interval_flags(ids, [(None, 4)], [(4, 4)]).tolist() == [True, False, False, False]
+    assert id_interval_flags(ids, [], [(5, 7)]).tolist() == [True, True, False, True]
+    assert id_interval_flags(np.array([], dtype=np.int32), [(1, 5)], []).tolist() == []
+
+
+# ======================================================================================
+# Bitmap index facets
+# ======================================================================================
+
+def _naive_facets(df: pd.DataFrame, selections: dict, base: np.ndarray) -> tuple[dict, np.ndarray]:
+    def matches(column) -> np.ndarray:
+        values = selections.get(column)
+        return df[column].isin(values).to_numpy() if values else np.ones(len(df), dtype=bool)
+
+    counts = {}
+    for column in DIMENSION_COLUMNS:
+        others = base.copy()
+        for other in DIMENSION_COLUMNS:
+            if other != column:
+                others &= matches(other)
+        counts[column] = df.loc[others, column].value_counts().loc[lambda n: n > 0].to_dict()
+    final = base.copy()
+    for column in DIMENSION_COLUMNS:
+        final &= matches(column)
+    return counts, final
+
+
+@pytest.fixture(scope='module')
+def small_frame():
+    rng = random.Random(1)
+    # 200 rows: not a multiple of 64, so the last mask word is partial
+    df = pd.DataFrame({
+        column: [rng.choice([f"{column[:3]}-{i}" for i in range(4)] + [None]) for _ in range(200)]
+        for column in DIMENSION_COLUMNS
+    }).astype('category')
+    return df
+
+
+def test_facets_are_leave_one_out_counts(small_frame):
+    rng = random.Random(2)
+    index = BitmapIndex(small_frame)
+    for _ in range(200):
+        selections = {}
+        for column in rng.sample(DIMENSION_COLUMNS, rng.randint(0, 4)):
+            # Sometimes a value that is not in the data at all
+            selections[column] = rng.sample(list(small_frame[column].cat.categories) + ["missing"], rng.randint(1, 2))
+        base = np.array([rng.random() < 0.8 for _ in range(len(small_frame))])
+        counts, mask = index.facets(selections, index.pack(base))
+        expected_counts, expected_final = _naive_facets(small_frame, selections, base)
+        assert counts == expected_counts
+        assert np.array_equal(index.flags(mask), expected_final)
+
+
+def test_facets_without_selections_count_every_row(small_frame):
+    index = BitmapIndex(small_frame)
+    counts, mask = index.facets({})
+    for column in DIMENSION_COLUMNS:
+        assert counts[column] == small_frame[column].value_counts().loc[lambda n: n > 0].to_dict()
+    assert index.flags(mask).all()
+
+
+def test_zero_count_selection_gives_no_rows(small_frame):
+    # A selected value with no rows left under the other filters narrows the result to nothing
+    index = BitmapIndex(small_frame)
+    column = DIMENSION_COLUMNS[0]
+    counts, mask = index.facets({column: ["missing"]})
+    assert index.rows(mask).size == 0
+    assert "missing" not in counts[column]
+
+
+# ======================================================================================
+# In-memory vs SQL pushdown on the shipped DB
+# ======================================================================================
+
+@pytest.fixture(scope='module', params=[False, True], ids=["unmigrated", "migrated"])
+def shipped(tmp_path_factory, request):
+    path = str(tmp_path_factory.mktemp("shipped") / "latency_results.db")
+    shutil.copy(SHIPPED_DB, path)
+    if request.param:
+        from migrations import migrate
+        migrate(path, verbose=False)
+    engine = create_engine(f"sqlite:///{path}")
+    df, _ = IncrementalLoader(engine).refresh()
+    return engine, df, BitmapIndex(df)
+
+
+def _filter_states(df: pd.DataFrame) -> list[tuple]:
+    # (selections, id_input, latency filter, threshold), drawn from values that exist in the data
+    rng = random.Random(3)
+    states = [({}, "", "Show All", 0.0), ({'product_name': ["PL-2000"]}, "", "Below", 10.0)]
+    for _ in range(25):
+        selections = {}
+        for column in rng.sample(DIMENSION_COLUMNS, rng.randint(0, 3)):
+            values = df[column].dropna().unique().tolist()
+            selections[column] = rng.sample(values, min(len(values), rng.randint(1, 2)))
+        id_input = rng.choice(["", "1-800", "100-, !500-900", "-1500, 2000-"])
+        latency = rng.choice([("Show All", 0.0), ("Above", 20.0), ("Below", 26.4), ("Below", 10.0)])
+        states.append((selections, id_input, *latency))
+    return states
+
+
+def _in_memory(df, index, selections, id_input, latency_filter_type, latency_threshold):
+    id_ranges, id_excludes = parse_id_ranges(id_input)
+    base = index.all_rows & index.pack(id_interval_flags(df['id'].to_numpy(), id_ranges, id_excludes))
+    if latency_filter_type == "Above":
+        base &= index.pack(df['result'].to_numpy() > latency_threshold)
+    elif latency_filter_type == "Below":
+        base &= index.pack(df['result'].to_numpy() < latency_threshold)
+    counts, mask = index.facets(selections, base)
+    return counts, index.flags(mask), (selections, id_ranges, id_excludes, latency_filter_type, latency_threshold)
+
+
+def test_facets_and_counts_match_sql(shipped):
+    engine, df, index = shipped
+    for state in _filter_states(df):
+        counts, flags, filter_args = _in_memory(df, index, *state)
+        assert counts == facet_counts(engine, *filter_args), state
+        assert int(flags.sum()) == count_filtered(engine, *filter_args), state
+
+
+@pytest.mark.parametrize("sort_column", ['id', 'result', 'datetime', 'product_name', 'frame_size'])
+@pytest.mark.parametrize("descending", [False, True], ids=["asc", "desc"])
+def test_pages_match_sql_keyset_pages(shipped, sort_column, descending):
+    engine, df, index = shipped
+    page_size = 40
+    order = sort_order(df, sort_column)
+    for state in _filter_states(df)[:8]:
+        _, flags, filter_args = _in_memory(df, index, *state)
+        rows = ordered_rows(order, flags, descending)
+        after = None
+        for page in range(3):
+            page_df, after = query_page(
+                engine, ['id'], *filter_args,
+                sort_column=sort_column, descending=descending, page_size=page_size, after=after,
+            )
+            expected = df['id'].to_numpy()[rows[page * page_size:(page + 1) * page_size]]
+            assert page_df['id'].tolist() == expected.tolist(), (state, page)
+            if after is None:
+                break
@@ -0,0 +1,209 @@
+"""
+Tests for the URL state codec (latency_url.py) and the value dictionary it is
+encoded against (latency_data.ValueDictionary).
+
+    python -m pytest -q test_latency_url.py
+"""
+import base64
+import random
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+
+from latency_data import DIMENSION_COLUMNS, ValueDictionary
+from latency_url import (
+    FLAG_DEFLATE,
+    LIST_KEYS,
+    STATE_FORMAT,
+    TEXT_KEYS,
+    canonical_state,
+    decode_state,
+    encode_state,
+    resolve_bitsets,
+    view_hash,
+)
+
+DICTIONARY = {key: [f"{key}-{i}" for i in range(40)] for key in LIST_KEYS}
+
+
+def round_trip(state: dict, dictionary: dict = DICTIONARY) -> dict:
+    texts, bitsets, fingerprint = decode_state(encode_state(state, dictionary))
+    return {**texts, **resolve_bitsets(bitsets, fingerprint, dictionary)}
+
+
+# ======================================================================================
+# Codec
+# ======================================================================================
+
+def test_round_trip_random_states():
+    rng = random.Random(0)
+    for _ in range(200):
+        state = {key: rng.sample(DICTIONARY[key], rng.randint(0, 6)) for key in LIST_KEYS}
+        state.update({key: rng.choice(["", "1-500, !7", "Below", "26.4"]) for key in TEXT_KEYS})
+        expected = {k: v for k, v in state.items() if v}
+        # Bitsets come back in dictionary order, not selection order
+        expected.update({k: sorted(v, key=DICTIONARY[k].index) for k, v in expected.items() if k in LIST_KEYS})
+        assert round_trip(state) == expected
+
+
+def test_empty_state():
+    assert round_trip({}) == {}
+
+
+def test_values_missing_from_the_dictionary_are_dropped():
+    assert round_trip({'product': ["product-3", "not there"]}) == {'product': ["product-3"]}
+
+
+def test_non_ascii_text_survives():
+    state = {TEXT_KEYS[0]: "1-5, !3 · μ"}
+    assert round_trip(state) == state
+
+
+def test_large_selection_is_deflated():
+    state = {key: DICTIONARY[key] for key in LIST_KEYS}
+    token = encode_state(state, DICTIONARY)
+    raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    assert raw[0] == STATE_FORMAT | FLAG_DEFLATE
+    assert round_trip(state) == state
+
+
+def test_token_is_url_safe_without_padding():
+    token = encode_state({key: DICTIONARY[key][::3] for key in LIST_KEYS}, DICTIONARY)
+    assert "=" not in token
+    assert set(token) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+@pytest.mark.parametrize("token", ["", "!!!", "AA", base64.urlsafe_b64encode(b"\x7f").decode()])
+def test_garbage_tokens_raise_value_error(token):
+    with pytest.raises(ValueError):
+        decode_state(token)
+
+
+def test_truncated_and_padded_tokens_raise_value_error():
+    token = encode_state({LIST_KEYS[0]: DICTIONARY[LIST_KEYS[0]][:2]}, DICTIONARY)
+    raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    for damaged in (raw[:-1], raw + b"\x00"):
+        with pytest.raises(ValueError):
+            decode_state(base64.urlsafe_b64encode(damaged).decode().rstrip("="))
+
+
+def test_appended_values_keep_old_tokens_valid():
+    key = LIST_KEYS[0]
+    token = encode_state({key: [DICTIONARY[key][5]]}, DICTIONARY)
+    grown = {**DICTIONARY, key: DICTIONARY[key] + ["appended"]}
+    _, bitsets, fingerprint = decode_state(token)
+    assert resolve_bitsets(bitsets, fingerprint, grown) == {key: [DICTIONARY[key][5]]}
+
+
+def test_changed_dictionary_is_detected():
+    key = LIST_KEYS[0]
+    token = encode_state({key: [DICTIONARY[key][5]]}, DICTIONARY)
+    _, bitsets, fingerprint = decode_state(token)
+    reordered = {**DICTIONARY, key: [DICTIONARY[key][1], DICTIONARY[key][0]] + DICTIONARY[key][2:]}
+    with pytest.raises(ValueError):
+        resolve_bitsets(bitsets, fingerprint, reordered)
+    shrunk = {**DICTIONARY, key: DICTIONARY[key][:3]}
+    with pytest.raises(ValueError):
+        resolve_bitsets(bitsets, fingerprint, shrunk)
+
+
+def test_fingerprint_ignores_the_unused_tail():
+    # Only the prefix a bitset points into is covered, so later values may change freely
+    key = LIST_KEYS[0]
+    token = encode_state({key: [DICTIONARY[key][2]]}, DICTIONARY)
+    _, bitsets, fingerprint = decode_state(token)
+    changed_tail = {**DICTIONARY, key: DICTIONARY[key][:3] + ["other"] * 5}
+    assert resolve_bitsets(bitsets, fingerprint, changed_tail) == {key: [DICTIONARY[key][2]]}
+
+
+def test_view_hash_is_stable_and_key_order_free():
+    state = {LIST_KEYS[0]: ["a"], TEXT_KEYS[0]: "1-5"}
+    flipped = dict(reversed(list(state.items())))
+    assert view_hash(state) == view_hash(flipped)
+    assert canonical_state(state) == canonical_state(flipped)
+    assert len(view_hash(state)) == 10
+    assert view_hash(state) != view_hash({**state, TEXT_KEYS[0]: "1-6"})
+
+
+# ======================================================================================
+# Value dictionary
+# ======================================================================================
+
+def make_db(path: str, rows: list[dict], migrated: bool) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE test_results (id INTEGER PRIMARY KEY, datetime TEXT, result VARCHAR, "
+        + ", ".join(f"{c} TEXT" for c in DIMENSION_COLUMNS) + ")"
+    )
+    conn.commit()
+    conn.close()
+    if migrated:
+        from migrations import migrate
+        migrate(path, verbose=False)
+    insert(path, rows)
+
+
+def insert(path: str, rows: list[dict]) -> None:
+    conn = sqlite3.connect(path)
+    for row in rows:
+        row = {'datetime': '2024-01-01 00:00:00.000000', 'result': '1.0', **row}
+        conn.execute(
+            f"INSERT INTO test_results ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+            list(row.values()),
+        )
+    conn.commit()
+    conn.close()
+
+
+def execute(path: str, sql: str) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute(sql)
+    conn.commit()
+    conn.close()
+
+
+def refresh(dictionary: ValueDictionary) -> dict:
+    # The tests write faster than the DB file's mtime moves; force a look at the DB
+    dictionary.change_signal = None
+    return dictionary.refresh()
+
+
+@pytest.fixture(params=[True, False], ids=["migrated", "unmigrated"])
+def db(tmp_path, request):
+    path = str(tmp_path / "latency_results.db")
+    make_db(path, [{'firmware_version': f"1.{i % 3}", 'product_name': "PL-1000"} for i in range(50)], request.param)
+    return path
+
+
+def test_dictionary_is_in_first_appearance_order(db):
+    values = refresh(ValueDictionary(create_engine(f"sqlite:///{db}")))
+    assert values['firmware_version'] == ["1.0", "1.1", "1.2"]
+    assert values['product_name'] == ["PL-1000"]
+
+
+def test_new_rows_append(db):
+    dictionary = ValueDictionary(create_engine(f"sqlite:///{db}"))
+    refresh(dictionary)
+    insert(db, [{'firmware_version': "2.0"}, {'firmware_version': "1.0"}])
+    assert refresh(dictionary)['firmware_version'] == ["1.0", "1.1", "1.2", "2.0"]
+
+
+def test_values_on_reused_ids_are_picked_up(db):
+    # Deleting the newest rows lowers MAX(id); SQLite then reuses those ids
+    dictionary = ValueDictionary(create_engine(f"sqlite:///{db}"))
+    refresh(dictionary)
+    execute(db, "DELETE FROM test_results WHERE id > 30")
+    insert(db, [{'firmware_version': "9.9.9"}])
+    values = refresh(dictionary)
+    assert values['firmware_version'] == ["1.0", "1.1", "1.2", "9.9.9"]
+    # ...so ?s= keeps the selection instead of silently dropping it
+    assert round_trip({'fw': ["9.9.9"]}, {'fw': values['firmware_version']}) == {'fw': ["9.9.9"]}
+
+
+def test_rewrites_below_the_watermark_are_picked_up(db):
+    dictionary = ValueDictionary(create_engine(f"sqlite:///{db}"))
+    refresh(dictionary)
+    execute(db, "UPDATE test_results SET product_name = 'PL-2000' WHERE id = 3")
+    # Appended, never reordered: tokens made before the rewrite stay valid
+    assert refresh(dictionary)['product_name'] == ["PL-1000", "PL-2000"]